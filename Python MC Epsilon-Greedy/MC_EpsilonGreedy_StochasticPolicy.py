@@ -1,7 +1,13 @@
 
 from Stochastic_Grid_world import standard_sticky_GW, GridWorld
+from Q_Table import QTable, episode_returns
+from Rollout_Executor import RolloutExecutor
+from Trajectory_Batch import TrajectoryBatch
+from Trajectory_Store import TrajectoryStore
+from MC_Trainer import MCTrainer
 from random import choice, randint
 from numpy import random
+import numpy as np
 
 
 
@@ -46,34 +52,6 @@ def play_episod( pi: dict, gw: GridWorld, mstep:int ):
     return vstates, actions, rewards
 
 
-# argmax best action by given state and Q-func:
-# ----------------------------------------------
-def best_action( state, q_func:dict, epsilon:float, env:GridWorld ):
-    
-    action_space = env.get_actions(state) 
-    action_probs = { act:0.0 for act in action_space }
-    action_size  = len(list(action_probs.keys()))
-    
-    argmax = action_space[0]
-    max_value = q_func.get((state,argmax), 0.0 )
-    
-    for act in action_space[1:]:
-        
-        value = q_func.get((state,act), 0.0 )
-        
-        if value > max_value :
-            max_value = value
-            argmax = act
-        
-    for act in action_space :
-        if act == argmax :
-            action_probs[act] = 1 - epsilon + epsilon/action_size
-        else :
-            action_probs[act] = epsilon/action_size
-    
-    return action_probs
-
-
 # Print Policy func Table:
 # -----------------------------
 def print_policy(V:dict,g:GridWorld):
@@ -108,38 +86,103 @@ def print_policy(V:dict,g:GridWorld):
 
 # Monte Carlo action-value improvement.
 # =====================================================
-def MC_policy_improvement( policy:dict, q_func:dict, g_returns:dict, env:GridWorld, epsilon, gamma=0.9 )-> dict:
+def MC_policy_improvement( policy:dict, q_table:QTable, env:GridWorld, epsilon, gamma=0.9,
+                           mstep:int=20, every_visit:bool=False )-> tuple:
         
     # Reset to starting state:
-    env.current_state = env.start_state
+    env.set_state( env.start_state )
     
-    states, actions, rewards = play_episod( policy, env, 20 )
+    states, actions, rewards = play_episod( policy, env, mstep )
     
-    g = 0.0
-    visited_states = []     # vs = [ (state,act), ... ]
+    # (s,a) ids of the played steps -> rewards[t+1] is gained by step t.
+    n_steps = len(rewards)-1
+    s_ids = [ env.state_id(st) for st in states[:n_steps] ]
+    a_ids = [ env.action_id(act) for act in actions[:n_steps] ]
     
+    # G(t) = R(t+1) + YG(t+1) , MC first Visit ( or every visit ).
+    steps, returns = episode_returns( [ s*q_table.n_actions + a for s, a in zip(s_ids, a_ids) ], rewards, gamma,
+                                      q_table.n_states*q_table.n_actions, every_visit )
     
-    # G(t) = R(t+1) + YG(t+1) 
-    for t in range( len(states)-2, -1, -1 ):
+    
+    # one batched Q(s,a) update, then updating probs of actions in the touched states.
+    if steps :
+        touched = q_table.update( np.array(s_ids)[steps], np.array(a_ids)[steps], returns )
         
-        g = rewards[t+1] + gamma*g
-        s = states[t]
-        a = actions[t]
-        key = (s,a)
+        for s, probs in zip( touched, q_table.epsilon_greedy(epsilon, touched) ):
+            st = env.state_of(s)
+            policy[st] = { act:float(probs[env.action_id(act)]) for act in env.get_actions(st) }
+    
+    return q_table, policy
+
+
+
+# Monte Carlo improvement from a batch of episodes.
+# =====================================================
+# policy: pi[S,A] action probs -> episodes of the executor, one vectorized returns pass & one Q update.
+def MC_batch_improvement( policy:np.ndarray, q_table:QTable, executor:RolloutExecutor, n_episodes:int, epsilon,
+                          gamma=0.9, every_visit:bool=False, store:TrajectoryStore=None )-> tuple:
+    
+    trajectories = executor.rollouts(policy, n_episodes)
+    if store is not None :
+        store.append(trajectories)              # logged with the probabilities the actions were drawn with
+    
+    batch = TrajectoryBatch.from_trajectories(trajectories)
+    touched = q_table.update( *batch.visits(gamma, q_table.n_actions, every_visit) )
+    
+    policy[touched] = q_table.epsilon_greedy(epsilon, touched)
+    return q_table, policy
+
+
+
+# Off-policy Monte Carlo ( importance sampling ).
+# =====================================================
+# Episodes played by the behavior policy b ( the epsilon-greedy pi ) evaluate another, target policy:
+#   ordinary IS : Q(s,a) = sum( W G ) / n(s,a)   ,   weighted IS : Q(s,a) = sum( W G ) / C(s,a) , C = sum( W )
+# W(t) = prod_{k>t} target(a_k|s_k) / b(a_k|s_k) , so collected episodes ( TrajectoryStore ) can be reused.
+
+# Playing n episodes by pi from the starting state -> TrajectoryBatch with b(a|s) = pi[state][act].
+# ------------------------------------------------------------------------------------------------------
+def play_episodes( pi:dict, env:GridWorld, n_episodes:int, mstep:int=20 )-> TrajectoryBatch:
+    
+    trajectories, behavior = [], []
+    for _ in range(n_episodes):
         
-        # MC first Visit
-        if key not in visited_states :
-            
-            visited_states.append(key)
-            
-            g_returns[key]["count"] += 1
-            g_returns[key]["mean"] = ((g_returns[key]["count"]-1)*g_returns[key]["mean"] + g ) / g_returns[key]["count"]
-            
-            q_func[key] = g_returns[key]["mean"]            # better to calc by count, new-G, prev-mean.
-            policy[s] = best_action( s, q_func, epsilon, env )       # Updating probs of actions in current state in the policy.
-            
+        env.set_state( env.start_state )
+        states, actions, rewards = play_episod( pi, env, mstep )
         
-    return q_func, g_returns, policy
+        n_steps = len(rewards)-1
+        s_ids = [ env.state_id(st) for st in states[:n_steps] ] + [ env.state_id(env.current_state) ]
+        
+        trajectories.append( ( np.array(s_ids), np.array([ env.action_id(act) for act in actions[:n_steps] ]),
+                               np.array(rewards[1:]) ) )
+        behavior.append( np.array([ pi[st][act] for st, act in zip(states[:n_steps], actions[:n_steps]) ]) )
+    
+    return TrajectoryBatch.from_trajectories( trajectories, behavior )
+
+
+# Off-policy prediction: Q of the target policy ( pi[S] action ids or pi[S,A] probs ) from the batch.
+# weighted -> weighted IS ( C ) , else ordinary IS ( N ).
+# -------------------------------------------------------------------------------------------------------
+def MC_off_policy_evaluation( batch:TrajectoryBatch, target:np.ndarray, q_table:QTable, gamma=0.9,
+                              weighted:bool=True, every_visit:bool=False )-> QTable:
+    
+    states, actions, returns, weights = batch.weighted_visits( gamma, target, q_table.n_actions, every_visit )
+    
+    if weighted :
+        q_table.update_weighted( states, actions, returns, weights )
+    else :
+        q_table.update( states, actions, weights*returns )
+    
+    return q_table
+
+
+# Off-policy control: the greedy policy of Q as target, improved after the batch -> (q_table, greedy[S]).
+# ---------------------------------------------------------------------------------------------------------
+def MC_off_policy_control( batch:TrajectoryBatch, q_table:QTable, gamma=0.9,
+                           weighted:bool=True, every_visit:bool=False )-> tuple:
+    
+    q_table = MC_off_policy_evaluation( batch, q_table.greedy(), q_table, gamma, weighted, every_visit )
+    return q_table, q_table.greedy()
 
 
 
@@ -152,12 +195,11 @@ if __name__ == "__main__" :
     gw = standard_sticky_GW(-0.09)
     
     epsilon = 0.1                       # Epsilon-Greedy factor
-    pi = {}                             # P={ state:act }
-    action_value_function_Q = {}        # Q={ (state,act):value }
-    g_returns = {}                      # R={ (state,act):{} }
+    pi = {}                             # P={ state:{ act:prob } }
+    q_table = QTable( gw.compile() )    # Q[S,A] mean returns & N[S,A] counts
     
     
-    # initialize Policy, Q-function, Returns-list -> a private method in Agent class!
+    # initialize Policy -> a private method in Agent class!
     for i in range(gw.rows):
         for j in range(gw.cols):
             
@@ -170,31 +212,35 @@ if __name__ == "__main__" :
             prob = 1.0/len(act_spc)
             
             for act in act_spc :
-                
                 pi[st][act] = prob
-                action_value_function_Q[(st,act)] = 0.0
-                g_returns[ (st,act) ] = { "mean":0.0, "count":0 }
             
     
     # Output:
     print("> Random Initial Policy")
     print_policy(pi,gw)
     # print("> Zero Initial Q-function")
-    # print_q_func(action_value_function_Q)
-    
+    # print_q_func(q_table.to_dict(gw.cols))
     
-    # Find Optimal Policy:
-    for i in range(10001):
-        if i%1000 == 0 :
-            print("> itr:",i)
-        action_value_function_Q, g_returns, pi = MC_policy_improvement(pi,action_value_function_Q,g_returns,gw,epsilon)
     
+    # Find Optimal Policy: until Q & the greedy policy settle ( or 1M episodes ).
+    # epsilon keeps exploring, so Q(s,a) stays noisier than in the greedy case -> looser tol.
+    trainer = MCTrainer( q_table, window=1000, tol=2e-2, patience=3, min_visits=30, max_episodes=1000000 )
+    trainer.train( lambda: MC_policy_improvement(pi,q_table,gw,epsilon) )
     
     # Output:
     print("\n> Optimal Founded Policy")
     print_policy(pi,gw)
+    
+    
+    # Off-policy: the greedy policy learned from episodes of the epsilon-greedy pi.
+    greedy_q = QTable( gw.compile() )
+    for _ in range(20):
+        greedy_q, greedy = MC_off_policy_control( play_episodes(pi, gw, 100), greedy_q )
+    
+    print("> Off-policy Greedy Policy ( weighted IS, 2000 episodes )")
+    print_policy( { gw.state_of(s):{ gw.action_of(a):1.0 } for s, a in enumerate(greedy) if a >= 0 }, gw )
     # print("> Optimal Founded Q-function")
-    # print_q_func(action_value_function_Q)
+    # print_q_func(q_table.to_dict(gw.cols))
     
 
 
@@ -0,0 +1,183 @@
+# -------------------------------------------------------
+
+# Process-pool episode rollouts for Monte Carlo control.
+# The GridWorld is sent once to every worker ( pool initializer ), each batch ships only the policy
+# as a compact array, and the episodes come back as id arrays.
+#
+# Seeding: every batch spawns one SeedSequence child per chunk of episodes ( chunk i -> worker task i ),
+# so a given seed & worker count gives identical batches, whatever process runs which chunk.
+#
+#   policy     : int array pi[S] ( action id, -1 for no action )  or  float array pi[S,A] ( pi(a|s) )
+#   trajectory : ( states[T+1], actions[T], rewards[T], behavior[T] )  -> rewards[t] is gained by actions[t],
+#                states[T] is the last reached state ( terminal, or cut by max_steps ),
+#                behavior[t] the probability actions[t] was drawn with ( 1/|A(s)| for an exploring start ).
+
+# -------------------------------------------------------
+
+from Stochastic_Grid_world import GridWorld
+from Compiled_Grid_World import CompiledGridWorld
+from multiprocessing import Pool
+from bisect import bisect_right
+import numpy as np
+import time
+import os
+
+
+# Worker side:
+# =========================
+
+_worker: dict = {}
+
+
+# Pool initializer -> one env per worker, stepped statelessly by step_id().
+# ---------------------------------------------------------------------------
+def _attach( env:GridWorld ):
+
+    model = env.compile()
+
+    _worker["env"] = env
+    _worker["mask"] = model.mask
+    _worker["terminal"] = model.terminal.tolist()
+    _worker["non_terminal"] = np.flatnonzero(~model.terminal)
+
+
+# Playing n episodes of the policy with the generator of seed_seq -> list of trajectories.
+# start=None -> uniform non-terminal starting state , explore -> exploring starts ( random first action ).
+# ------------------------------------------------------------------------------------------------------------
+def _rollouts( policy:np.ndarray, n_episodes:int, seed_seq:np.random.SeedSequence,
+               start:int, max_steps:int, explore:bool ) -> list :
+
+    env, mask, terminal = _worker["env"], _worker["mask"], _worker["terminal"]
+    rng = np.random.default_rng(seed_seq)
+
+    stochastic = policy.ndim == 2
+    if stochastic :
+        probs = policy.astype(np.float64)
+        cum = probs.cumsum(axis=1).tolist()                                 # pi(a|s) CDF per state
+        probs = ( probs / np.maximum(probs.sum(axis=1, keepdims=True), 1e-300) ).tolist()
+    else :
+        pi = policy.tolist()
+
+    starts = [start]*n_episodes if start is not None else \
+             _worker["non_terminal"][ rng.integers(len(_worker["non_terminal"]), size=n_episodes) ].tolist()
+
+    trajectories = []
+    for s in starts :
+
+        states, actions, rewards, behavior = [s], [], [], []
+        done = terminal[s]
+
+        while not done and len(actions) < max_steps :
+
+            if explore and not actions :
+                available = np.flatnonzero(mask[s])
+                a, b = int( rng.choice(available) ), 1.0/len(available)
+            elif stochastic :
+                a = min( bisect_right(cum[s], rng.random()*cum[s][-1]), len(cum[s])-1 )
+                b = probs[s][a]
+            else :
+                a, b = pi[s], 1.0
+
+            s, reward, done = env.step_id(s, a, rng)
+
+            states.append(s)
+            actions.append(a)
+            rewards.append(reward)
+            behavior.append(b)
+
+        trajectories.append( ( np.array(states, dtype=np.int64), np.array(actions, dtype=np.int64),
+                               np.array(rewards, dtype=np.float64), np.array(behavior, dtype=np.float64) ) )
+
+    return trajectories
+
+
+# Rollout executor:
+# =========================
+class RolloutExecutor :
+
+    def __init__(self, env:GridWorld, workers:int=None, seed:int=None,
+                 start:tuple=None, max_steps:int=20, explore:bool=False ):
+
+        self.workers:int = workers or os.cpu_count()
+        self.seed_seq = np.random.SeedSequence(seed)
+        self.model:CompiledGridWorld = env.compile()          # available actions, for checking policies
+
+        self.start:int = env.state_id(start) if start is not None else None
+        self.max_steps:int = max_steps
+        self.explore:bool = explore
+
+        self.pool = Pool(self.workers, initializer=_attach, initargs=(env,))
+
+
+    # A batch of n episodes under the policy -> trajectories, in chunk order.
+    #--------------------------------------------------------------------------
+    def rollouts(self, policy:np.ndarray, n_episodes:int) -> list :
+
+        # compact policy: action ids fit int8, pi(a|s) float32.
+        policy = np.asarray(policy)
+        if policy.ndim == 2 :
+            self.__check_policy(policy)
+        policy = policy.astype(np.int8) if policy.ndim == 1 else policy.astype(np.float32)
+
+        sizes = [ n_episodes//self.workers + (i < n_episodes % self.workers) for i in range(self.workers) ]
+        seeds = self.seed_seq.spawn(self.workers)
+
+        chunks = self.pool.starmap( _rollouts, [ ( policy, size, seed, self.start, self.max_steps, self.explore )
+                                                 for size, seed in zip(sizes, seeds) ] )
+
+        return [ trajectory for chunk in chunks for trajectory in chunk ]
+
+
+    # Stochastic policy rows of non-terminal states need mass, and only on available actions :
+    # the CDF draw of _rollouts falls back on the last action for a row summing to 0.
+    #----------------------------------------------------------------------------------------------
+    def __check_policy(self, policy:np.ndarray) -> None :
+
+        model = self.model
+        if policy.shape != model.mask.shape :
+            raise ValueError(f"policy shape {policy.shape} is not (n_states, n_actions) = {model.mask.shape}")
+
+        active = ~model.terminal
+        bad = ( (policy < 0) | ((policy > 0) & ~model.mask) ).any(axis=1) | ~(policy.sum(axis=1) > 0)
+        bad = np.flatnonzero(bad & active)
+
+        if len(bad) :
+            raise ValueError(f"policy rows of states {[ model.state_of(s) for s in bad[:5] ]} "
+                             f"need positive mass, on available actions only")
+
+
+    def close(self) -> None :
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+
+# Test Space :
+#-----------------------
+if __name__ == "__main__" :
+
+    from Stochastic_Grid_world import standard_sticky_GW
+
+    env = standard_sticky_GW(-0.09)
+    policy = np.full( (env.rows*env.cols, 4), 0.25 ) * env.compile().mask
+
+    batches = []
+    for run in range(2):
+        with RolloutExecutor(env, workers=4, seed=2023) as executor :
+
+            start = time.perf_counter()
+            batch = executor.rollouts(policy, 100000)
+            seconds = time.perf_counter() - start
+
+        batches.append(batch)
+        print("> run %d: %d episodes  |  %.0f episodes/s"%( run, len(batch), len(batch)/seconds ))
+
+    identical = all( all( np.array_equal(x, y) for x, y in zip(a, b) ) for a, b in zip(*batches) )
+    print("> identical runs:", identical)
@@ -0,0 +1,170 @@
+# -------------------------------------------------------
+
+# Padded batch of episodes for Monte Carlo updates ( B episodes, T = longest episode ):
+#   states  [B,T+1] int64   -> states[b,t] is the state of step t, states[b,lengths[b]] the last reached state
+#   actions [B,T]   int64   -> action ids, -1 on padding
+#   rewards [B,T]   float64 -> rewards[b,t] is gained by actions[b,t], 0 on padding
+#   lengths [B]     int64   -> steps of each episode
+#   behavior[B,T]   float64 -> b(a|s) of the behavior policy for each step, 1 on padding ( optional )
+#
+# Discounted returns of every step of every episode come from one reverse linear filter:
+#   G(t) = R(t+1) + gamma G(t+1)  ->  y[n] = x[n] + gamma y[n-1] over the reversed rewards.
+#
+# Off-policy ( importance sampling ): the return G(t) of (s_t,a_t) under the target policy pi is weighted by
+#   W(t) = prod_{k>t} pi(a_k|s_k) / b(a_k|s_k)   -> a reverse cumulative product, 0 after the last zero ratio.
+
+# -------------------------------------------------------
+
+from scipy.signal import lfilter
+import numpy as np
+
+
+# pi(a|s) of the taken actions under a policy array.
+#   pi[S] ( action ids ) -> 1 for the policy's action, else 0  ,  pi[S,A] -> pi(a|s)
+#-------------------------------------------------------------------------------------
+def action_probs( policy:np.ndarray, states:np.ndarray, actions:np.ndarray ) -> np.ndarray :
+
+    policy = np.asarray(policy)
+    if policy.ndim == 1 :
+        return ( policy[states] == actions ).astype(np.float64)
+
+    return policy[states, actions].astype(np.float64)
+
+
+
+class TrajectoryBatch :
+
+    def __init__(self, states:np.ndarray, actions:np.ndarray, rewards:np.ndarray, lengths:np.ndarray,
+                 behavior:np.ndarray=None ):
+
+        self.states:np.ndarray  = states
+        self.actions:np.ndarray = actions
+        self.rewards:np.ndarray = rewards
+        self.lengths:np.ndarray = lengths
+        self.behavior:np.ndarray = behavior
+
+
+    # Padding a list of ( states[T+1], actions[T], rewards[T] [, behavior[T]] ) trajectories ( RolloutExecutor.rollouts ).
+    # behavior: per-episode b(a|s) arrays, default: the trajectories' own when they carry them.
+    #------------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def from_trajectories(cls, trajectories:list, behavior:list=None ):
+
+        if behavior is None and len(trajectories) and len(trajectories[0]) > 3 :
+            behavior = [ t[3] for t in trajectories ]
+
+        lengths = np.array( [ len(t[1]) for t in trajectories ], dtype=np.int64 )
+        offsets = np.concatenate( ([0], np.cumsum(lengths)) )
+
+        if not len(trajectories) :
+            return cls.from_flat( offsets, *[ np.zeros(0) ]*4, behavior=np.zeros(0) if behavior is not None else None )
+
+        return cls.from_flat( offsets,
+                              np.concatenate( [ t[0][:-1] for t in trajectories ] ),
+                              np.concatenate( [ t[1] for t in trajectories ] ),
+                              np.concatenate( [ t[2] for t in trajectories ] ),
+                              np.array( [ t[0][-1] for t in trajectories ] ),
+                              behavior=np.concatenate(behavior) if behavior is not None else None )
+
+
+    # Padding flat columns ( TrajectoryStore chunks ): episode b is steps offsets[b]:offsets[b+1],
+    # final[b] its last reached state.
+    #------------------------------------------------------------------------------------------------
+    @classmethod
+    def from_flat(cls, offsets:np.ndarray, states:np.ndarray, actions:np.ndarray, rewards:np.ndarray,
+                  final:np.ndarray, behavior:np.ndarray=None ):
+
+        lengths = np.diff(offsets).astype(np.int64)
+        n, T = len(lengths), int(lengths.max()) if len(lengths) else 0
+
+        # (row, col) of every step, in episode order.
+        rows = np.repeat( np.arange(n), lengths )
+        cols = np.arange(lengths.sum()) - np.repeat( offsets[:-1] - offsets[0], lengths )
+
+        padded_states   = np.full((n, T+1), -1, dtype=np.int64)
+        padded_actions  = np.full((n, T), -1, dtype=np.int64)
+        padded_rewards  = np.zeros((n, T))
+        padded_behavior = np.ones((n, T)) if behavior is not None else None
+
+        padded_actions[rows, cols] = actions
+        padded_rewards[rows, cols] = rewards
+        padded_states[rows, cols]  = states
+        padded_states[np.arange(n), lengths] = final
+        if behavior is not None :
+            padded_behavior[rows, cols] = behavior
+
+        return cls(padded_states, padded_actions, padded_rewards, lengths, padded_behavior)
+
+
+    # Steps inside the episodes -> mask[B,T].
+    #-------------------------------------------
+    def valid(self) -> np.ndarray :
+        return np.arange(self.actions.shape[1]) < self.lengths[:,None]
+
+
+    # Discounted returns G[b,t] of every step, one pass for the whole batch ( 0 on padding ).
+    #-------------------------------------------------------------------------------------------
+    def returns(self, gamma:float) -> np.ndarray :
+
+        if self.rewards.size == 0 :
+            return np.zeros(self.rewards.shape)
+
+        return lfilter( [1.0], [1.0, -gamma], self.rewards[:, ::-1], axis=1 )[:, ::-1]
+
+
+    # Importance weights W[b,t] of every step's return for the target policy ( 0 on padding ).
+    #   target: pi[S] action ids ( e.g. QTable.greedy ) or pi[S,A] probs , behavior: b(a|s) of the batch.
+    #------------------------------------------------------------------------------------------------------
+    def importance_weights(self, target:np.ndarray) -> np.ndarray :
+
+        valid = self.valid() & (self.actions >= 0)
+        rho = np.ones(self.actions.shape)
+
+        pi = action_probs( target, self.states[:, :-1][valid], self.actions[valid] )
+        b = self.behavior[valid]
+        rho[valid] = np.divide( pi, b, out=np.zeros(len(pi)), where=b > 0 )
+
+        # prod_{k>=t} rho -> shifted by one step: prod_{k>t} rho.
+        W = np.ones(rho.shape)
+        W[:, :-1] = np.cumprod( rho[:, ::-1], axis=1 )[:, ::-1][:, 1:]
+
+        return np.where(valid, W, 0.0)
+
+
+    # (row, col) of the steps to average into Q.
+    # first-visit: the first step of each (s,a) within each episode , else every step.
+    # Steps of unavailable actions ( -1 ) are left out.
+    #-----------------------------------------------------------------------------------
+    def __steps(self, n_actions:int, every_visit:bool) -> tuple :
+
+        rows, cols = np.nonzero( self.valid() & (self.actions >= 0) )
+
+        if not every_visit and len(rows) :
+
+            keys = self.states[rows, cols]*n_actions + self.actions[rows, cols]
+
+            # row-major order -> the first index of a (episode, key) pair is its first visit.
+            _, first = np.unique( rows*(int(keys.max())+1) + keys, return_index=True )
+            first.sort()
+            rows, cols = rows[first], cols[first]
+
+        return rows, cols
+
+
+    # Flat (states, actions, returns) of the steps to average into Q -> QTable.update(*visits).
+    #--------------------------------------------------------------------------------------------
+    def visits(self, gamma:float, n_actions:int, every_visit:bool=False) -> tuple :
+
+        rows, cols = self.__steps(n_actions, every_visit)
+        return self.states[rows, cols], self.actions[rows, cols], self.returns(gamma)[rows, cols]
+
+
+    # Flat (states, actions, returns, weights) of the steps, weighted for the target policy.
+    #   ordinary IS -> QTable.update(states, actions, weights*returns)
+    #   weighted IS -> QTable.update_weighted(states, actions, returns, weights)
+    #---------------------------------------------------------------------------------------------
+    def weighted_visits(self, gamma:float, target:np.ndarray, n_actions:int, every_visit:bool=False) -> tuple :
+
+        rows, cols = self.__steps(n_actions, every_visit)
+        return ( self.states[rows, cols], self.actions[rows, cols], self.returns(gamma)[rows, cols],
+                 self.importance_weights(target)[rows, cols] )
@@ -0,0 +1,208 @@
+# -------------------------------------------------------
+
+# Append-only on-disk log of Monte Carlo episodes, for replaying them without regenerating:
+# re-evaluating new policies, comparing first-visit & every-visit estimates, resuming training.
+#
+# A store is a directory:
+#   index.json          -> { "format", "version", "n_actions", "chunks":[ { "file", "episodes", "steps" } ] }
+#   chunk-000000.gwt    -> immutable columnar chunks ( Compiled_Grid_World aligned arrays file ):
+#       offsets  [E+1] int64   -> episode e is the steps offsets[e]:offsets[e+1] of the chunk
+#       states   [N]   int32   -> state id of each step
+#       actions  [N]   int8    -> action id taken at each step
+#       rewards  [N]   float64 -> reward gained by each step
+#       behavior [N]   float64 -> b(a|s) of the behavior policy that took the action
+#       final    [E]   int32   -> last reached state of each episode ( terminal, or cut by max_steps )
+#
+# Appended episodes are buffered until chunk_steps steps, then written as one chunk; the index is
+# replaced atomically after the chunk file, so a crash never leaves a chunk half-listed.
+# Chunks are read back as np.memmap views.
+
+# -------------------------------------------------------
+
+from Compiled_Grid_World import write_arrays, map_arrays
+from Trajectory_Batch import TrajectoryBatch, action_probs
+from Q_Table import QTable
+import numpy as np
+import json
+import time
+import os
+
+
+TRAJ_MAGIC   = b"GWTRAJ\0\0"
+TRAJ_VERSION = 1
+TRAJ_EXT     = ".gwt"
+STORE_FORMAT = "gridworld-trajectories"
+
+
+class TrajectoryStore :
+
+    def __init__(self, path:str, n_actions:int=None, chunk_steps:int=1<<20 ):
+
+        self.path:str = path
+        self.chunk_steps:int = chunk_steps
+
+        index_file = os.path.join(path, "index.json")
+        if os.path.exists(index_file) :
+
+            with open(index_file) as f:
+                self.index:dict = json.load(f)
+
+            if self.index.get("format") != STORE_FORMAT :
+                raise ValueError(f"{path}: not a trajectory store")
+            if self.index["version"] > TRAJ_VERSION :
+                raise ValueError(f"{path}: store version {self.index['version']} is newer than {TRAJ_VERSION}")
+            if n_actions is not None and n_actions != self.index["n_actions"] :
+                raise ValueError(f"{path}: store has {self.index['n_actions']} actions, not {n_actions}")
+
+        else :
+
+            if n_actions is None :
+                raise ValueError(f"{path}: new trajectory store needs n_actions")
+
+            os.makedirs(path, exist_ok=True)
+            self.index:dict = { "format":STORE_FORMAT, "version":TRAJ_VERSION, "n_actions":n_actions, "chunks":[] }
+            self.__write_index()
+
+        self.__pending:list = []        # buffered ( states[T+1], actions[T], rewards[T], behavior[T] ) episodes
+        self.__pending_steps:int = 0
+
+
+    # Stored & buffered counts.
+    #------------------------------
+    def n_episodes(self) -> int :
+        return sum( chunk["episodes"] for chunk in self.index["chunks"] ) + len(self.__pending)
+
+    def n_steps(self) -> int :
+        return sum( chunk["steps"] for chunk in self.index["chunks"] ) + self.__pending_steps
+
+
+    # Appending ( states[T+1], actions[T], rewards[T] [, behavior[T]] ) trajectories ( RolloutExecutor.rollouts ).
+    # behavior: default -> the b(a|s) the trajectories carry ( the probabilities their actions were drawn with ),
+    #           a policy array that played them ( action_probs ), or a list of per-episode b(a|s) arrays.
+    #-----------------------------------------------------------------------------------------------------------------
+    def append(self, trajectories:list, behavior=None ) -> None :
+
+        if behavior is None :
+            if any( len(t) < 4 for t in trajectories ) :
+                raise ValueError("trajectories without behavior probabilities need a behavior policy")
+            behavior = [ t[3] for t in trajectories ]
+        elif isinstance(behavior, np.ndarray) :
+            behavior = [ action_probs(behavior, t[0][:-1], t[1]) for t in trajectories ]
+
+        for (states, actions, rewards, *_), probs in zip(trajectories, behavior):
+            self.__pending.append( (states, actions, rewards, probs) )
+            self.__pending_steps += len(actions)
+
+        if self.__pending_steps >= self.chunk_steps :
+            self.flush()
+
+
+    # Writing the buffered episodes as a new chunk.
+    #------------------------------------------------
+    def flush(self) -> None :
+
+        if not self.__pending :
+            return
+
+        episodes = self.__pending
+        lengths = [ len(actions) for _, actions, _, _ in episodes ]
+
+        arrays = { "offsets":  np.concatenate( ([0], np.cumsum(lengths)) ).astype(np.int64),
+                   "states":   np.concatenate( [ s[:-1] for s, _, _, _ in episodes ] ).astype(np.int32),
+                   "actions":  np.concatenate( [ a for _, a, _, _ in episodes ] ).astype(np.int8),
+                   "rewards":  np.concatenate( [ r for _, _, r, _ in episodes ] ).astype(np.float64),
+                   "behavior": np.concatenate( [ b for _, _, _, b in episodes ] ).astype(np.float64),
+                   "final":    np.array( [ s[-1] for s, _, _, _ in episodes ], dtype=np.int32 ) }
+
+        name = "chunk-%06d%s"%( len(self.index["chunks"]), TRAJ_EXT )
+        write_arrays( os.path.join(self.path, name), TRAJ_MAGIC, TRAJ_VERSION,
+                      { "episodes":len(episodes), "steps":int(sum(lengths)) }, arrays )
+
+        self.index["chunks"].append( { "file":name, "episodes":len(episodes), "steps":int(sum(lengths)) } )
+        self.__write_index()
+
+        self.__pending, self.__pending_steps = [], 0
+
+
+    def __write_index(self) -> None :
+
+        index_file = os.path.join(self.path, "index.json")
+        with open(index_file + ".tmp", 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(index_file + ".tmp", index_file)
+
+
+    # Stored chunks -> { "offsets", "states", "actions", "rewards", "behavior", "final" } memmap views.
+    #----------------------------------------------------------------------------------------------------
+    def chunks(self):
+
+        for chunk in self.index["chunks"] :
+            _, arrays = map_arrays( os.path.join(self.path, chunk["file"]), TRAJ_MAGIC, TRAJ_VERSION )
+            yield arrays
+
+
+    # Stored chunks as padded TrajectoryBatch ( with behavior probabilities ).
+    #---------------------------------------------------------------------------
+    def batches(self):
+
+        for arrays in self.chunks() :
+            yield TrajectoryBatch.from_flat( arrays["offsets"], arrays["states"], arrays["actions"],
+                                             arrays["rewards"], arrays["final"], behavior=arrays["behavior"] )
+
+
+    # Averaging the returns of every stored episode into the QTable -> q_table.
+    #------------------------------------------------------------------------------
+    def replay(self, q_table:QTable, gamma:float=0.9, every_visit:bool=False) -> QTable :
+
+        for batch in self.batches() :
+            q_table.update( *batch.visits(gamma, q_table.n_actions, every_visit) )
+
+        return q_table
+
+
+    def close(self) -> None :
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+
+# Test Space :
+#-----------------------
+if __name__ == "__main__" :
+
+    from Stochastic_Grid_world import standard_sticky_GW
+    from Vector_Grid_World import VectorGridWorld
+    from Rollout_Executor import RolloutExecutor
+    import tempfile
+
+    env = standard_sticky_GW(-0.09)
+    model = env.compile()
+    policy = VectorGridWorld(env, 1).uniform_policy()
+
+    with tempfile.TemporaryDirectory() as path :
+
+        # Logging once ...
+        with RolloutExecutor(env, workers=2, seed=2023) as executor, TrajectoryStore(path, model.n_actions) as store :
+
+            start = time.perf_counter()
+            for _ in range(10):
+                store.append( executor.rollouts(policy, 10000) )
+            seconds = time.perf_counter() - start
+
+        print("> logged: %d episodes, %d steps  |  %.0f episodes/s"%( store.n_episodes(), store.n_steps(), store.n_episodes()/seconds ))
+
+        # ... replaying from disk.
+        store = TrajectoryStore(path)
+        start = time.perf_counter()
+        first = store.replay( QTable(model), every_visit=False )
+        every = store.replay( QTable(model), every_visit=True )
+        seconds = time.perf_counter() - start
+
+        print("> replayed twice in %.2fs"%seconds)
+        print("> max |Q first-visit - Q every-visit|: %.4f"%np.abs(first.Q - every.Q).max())
@@ -1,6 +1,12 @@
 
 from Stochastic_Grid_world import standard_sticky_GW, GridWorld, print_policy, print_q_func
+from Q_Table import QTable, episode_returns
+from Rollout_Executor import RolloutExecutor
+from Trajectory_Batch import TrajectoryBatch
+from Trajectory_Store import TrajectoryStore
+from MC_Trainer import MCTrainer
 from random import choice, randint
+import numpy as np
 
 
 
@@ -58,62 +64,53 @@ def random_state( env:GridWorld ):
     return choice( states )
 
 
-# argmax best action by given state and Q-func:
-# ----------------------------------------------
-def best_action( state, q_func:dict, env:GridWorld ):
+
+# Monte Carlo action-value improvement.
+# =====================================================
+def MC_policy_improvement( policy:dict, q_table:QTable, env:GridWorld, gamma=0.9,
+                           mstep:int=20, every_visit:bool=False )-> tuple:
+        
+    # Random select starting state:
+    env.set_state( random_state(env) )
     
-    action_space = env.get_actions(state)
-    max_value = -10000
-    argmax = "&"
+    states, actions, rewards = play_episod( policy, env, mstep )
     
-    for act in action_space:
-        
-        value = q_func.get((state,act), 0.0 )
+    # (s,a) ids of the played steps -> rewards[t+1] is gained by step t.
+    n_steps = len(rewards)-1
+    s_ids = [ env.state_id(st) for st in states[:n_steps] ]
+    a_ids = [ env.action_id(act) for act in actions[:n_steps] ]
+    
+    # G(t) = R(t+1) + YG(t+1) , MC first Visit ( or every visit ).
+    steps, returns = episode_returns( [ s*q_table.n_actions + a for s, a in zip(s_ids, a_ids) ], rewards, gamma,
+                                      q_table.n_states*q_table.n_actions, every_visit )
+    
+    
+    # one batched Q(s,a) update, then improving the touched states.
+    if steps :
+        touched = q_table.update( np.array(s_ids)[steps], np.array(a_ids)[steps], returns )
         
-        if value >= max_value :
-            max_value = value
-            argmax = act
+        for s, a in zip( touched, q_table.greedy(touched) ):
+            policy[env.state_of(s)] = env.action_of(a) if a >= 0 else "&"
     
-    return argmax
+    return q_table, policy
 
 
 
-# Monte Carlo action-value improvement.
+# Monte Carlo improvement from a batch of episodes.
 # =====================================================
-def MC_policy_improvement( policy:dict, q_func:dict, g_returns:dict, env:GridWorld, gamma=0.9 )-> dict:
-        
-    # Random select starting state:
-    env.current_state = random_state(env)
-    
-    states, actions, rewards = play_episod( policy, env, 20 )
+# policy: pi[S] action ids -> episodes of the executor, one vectorized returns pass & one Q update.
+def MC_batch_improvement( policy:np.ndarray, q_table:QTable, executor:RolloutExecutor, n_episodes:int,
+                          gamma=0.9, every_visit:bool=False, store:TrajectoryStore=None )-> tuple:
     
-    g = 0.0
-    visited_states = []     # vs = [ (state,act), ... ]
+    trajectories = executor.rollouts(policy, n_episodes)
+    if store is not None :
+        store.append(trajectories)              # logged with the probabilities the actions were drawn with
     
+    batch = TrajectoryBatch.from_trajectories(trajectories)
+    touched = q_table.update( *batch.visits(gamma, q_table.n_actions, every_visit) )
     
-    # G(t) = R(t+1) + YG(t+1) 
-    for t in range( len(states)-2, -1, -1 ):
-        
-        g = rewards[t+1] + gamma*g
-        s = states[t]
-        a = actions[t]
-        key = (s,a)
-        
-        # MC first Visit
-        if key not in visited_states :
-            
-            visited_states.append(key)
-            
-            g_returns[key]["count"] += 1
-            g_returns[key]["mean"] = ((g_returns[key]["count"]-1)*g_returns[key]["mean"] + g ) / g_returns[key]["count"]
-            
-            old_value = q_func[key]                     # Add i-th G(t) for State:s
-            q_func[key] = g_returns[key]["mean"]        # better to calc by count, new-G, prev-mean.
-            
-            policy[s] = best_action( s, q_func, env )
-            
-        
-    return q_func, g_returns, policy
+    policy[touched] = q_table.greedy(touched)
+    return q_table, policy
 
 
 
@@ -126,11 +123,10 @@ if __name__ == "__main__" :
     gw = standard_sticky_GW(-0.09)
     
     pi = {}                             # P={ state:act }
-    action_value_function_Q = {}        # Q={ (state,act):value }
-    g_returns = {}                      # R={ (state,act):{} }
+    q_table = QTable( gw.compile() )    # Q[S,A] mean returns & N[S,A] counts
     
     
-    # initialize Policy, Q-function, Returns-list -> a private method in Agent class!
+    # initialize Policy -> a private method in Agent class!
     for i in range(gw.rows):
         for j in range(gw.cols):
             
@@ -141,30 +137,23 @@ if __name__ == "__main__" :
             act_spc = gw.get_actions(st)
             pi[st] = choice(act_spc)
             
-            for act in act_spc :
-                
-                action_value_function_Q[(st,act)] = 0.0
-                g_returns[ (st,act) ] = { "mean":0.0, "count":0 }
-            
     
     # Output:
     print("> Random Initial Policy")
     print_policy(pi,gw)
     # print("> Zero Initial Q-function")
-    # print_q_func(action_value_function_Q)
+    # print_q_func(q_table.to_dict(gw.cols))
     
     
-    # Find Optimal Policy:
-    for i in range(10001):
-        if i%1000 == 0 :
-            print("> itr:",i)
-        action_value_function_Q, g_returns, pi = MC_policy_improvement(pi,action_value_function_Q,g_returns,gw)
+    # Find Optimal Policy: until Q & the greedy policy settle ( or 1M episodes ).
+    trainer = MCTrainer( q_table, window=1000, tol=1e-3, patience=3, min_visits=30, max_episodes=1000000 )
+    trainer.train( lambda: MC_policy_improvement(pi,q_table,gw) )
     
     # Output:
     print("\n> Optimal Founded Policy")
     print_policy(pi,gw)
     # print("> Optimal Founded Q-function")
-    # print_q_func(action_value_function_Q)
+    # print_q_func(q_table.to_dict(gw.cols))
     
 
 
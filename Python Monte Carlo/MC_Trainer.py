@@ -0,0 +1,94 @@
+# -------------------------------------------------------
+
+# Monte Carlo control loop with convergence-based early stopping.
+# Every window of episodes the trainer checks the QTable against the previous check:
+#   max |dQ|    -> largest change of Q during the window, over the (s,a) backed by >= min_visits returns
+#   stability   -> consecutive checks without a change of the greedy policy
+#   visits      -> fewest returns behind the greedy action of a visited state
+# and stops once max |dQ| < tol , stable checks >= patience and visits >= min_visits,
+# or when the episode / time budget runs out.
+
+# -------------------------------------------------------
+
+from Q_Table import QTable
+import numpy as np
+import time
+
+
+class MCTrainer :
+
+    def __init__(self, q_table:QTable, window:int=1000, tol:float=1e-3, patience:int=3, min_visits:int=30,
+                 max_episodes:int=1000000, max_seconds:float=None, verbose:bool=True ):
+
+        self.q_table:QTable = q_table
+        self.window:int = window
+        self.tol:float = tol
+        self.patience:int = patience
+        self.min_visits:int = min_visits
+        self.max_episodes:int = max_episodes        # None -> no episode budget
+        self.max_seconds:float = max_seconds        # None -> no time budget
+        self.verbose:bool = verbose
+
+        self.report:dict = {}
+
+
+    # Convergence measures of the QTable since the previous check ( Q_prev, greedy_prev ).
+    #----------------------------------------------------------------------------------------
+    def check(self, Q_prev:np.ndarray, greedy_prev:np.ndarray) -> tuple :
+
+        q = self.q_table
+        settled = q.mask & (q.N >= self.min_visits)           # rarely tried actions would dominate the max
+        delta = float( np.abs(q.Q - Q_prev)[settled].max() ) if settled.any() else np.inf
+
+        greedy = q.greedy()
+        changed = int( (greedy != greedy_prev).sum() )
+
+        visited = np.flatnonzero( (greedy >= 0) & (q.N.sum(axis=1) > 0) )
+        visits = int( q.N[visited, greedy[visited]].min() ) if len(visited) else 0
+
+        return delta, greedy, changed, visits
+
+
+    # Running step() until convergence or budget -> report.
+    # step: one training update playing episodes_per_step episodes ( QTable updated in place ).
+    #-------------------------------------------------------------------------------------------
+    def train(self, step, episodes_per_step:int=1) -> dict :
+
+        Q_prev, greedy_prev = self.q_table.Q.copy(), self.q_table.greedy()
+        episodes, stable, next_check = 0, 0, self.window
+        reason = "running"
+
+        start = time.perf_counter()
+        while reason == "running" :
+
+            step()
+            episodes += episodes_per_step
+            if episodes < next_check :
+                continue
+            next_check += self.window
+
+            delta, greedy_prev, changed, visits = self.check(Q_prev, greedy_prev)
+            Q_prev = self.q_table.Q.copy()
+            stable = stable + 1 if changed == 0 else 0
+
+            seconds = time.perf_counter() - start
+            if self.verbose :
+                print("> episodes: %d  |  max|dQ|: %.2e  |  policy changes: %d  |  min visits: %d  |  %.0f episodes/s"%(
+                      episodes, delta, changed, visits, episodes/seconds ))
+
+            if delta < self.tol and stable >= self.patience and visits >= self.min_visits :
+                reason = "converged"
+            elif self.max_episodes is not None and episodes >= self.max_episodes :
+                reason = "max_episodes"
+            elif self.max_seconds is not None and seconds >= self.max_seconds :
+                reason = "max_seconds"
+
+        seconds = time.perf_counter() - start
+        self.report = { "reason":reason, "episodes":episodes, "seconds":seconds, "episodes_per_s":episodes/seconds,
+                        "max_dQ":delta, "stable_checks":stable, "min_visits":visits }
+
+        if self.verbose :
+            print("> stopped ( %s ) after %d episodes in %.2fs  |  %.0f episodes/s"%(
+                  reason, episodes, seconds, episodes/seconds ))
+
+        return self.report
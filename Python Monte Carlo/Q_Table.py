@@ -0,0 +1,128 @@
+# -------------------------------------------------------
+
+# Array-backed action-value store for Monte Carlo control:
+#   Q[S,A]    float64 -> mean of the sampled returns of (s,a)
+#   N[S,A]    int64   -> number of returns averaged into Q(s,a)
+#   C[S,A]    float64 -> cumulative importance weights of Q(s,a) ( weighted off-policy updates )
+#   mask[S,A] bool    -> available actions ( of the compiled model )
+# ~25 bytes per (s,a) instead of the { (state,act):value } & { (state,act):{"mean","count"} } dicts.
+
+# -------------------------------------------------------
+
+from Compiled_Grid_World import CompiledGridWorld, ACTIONS
+import numpy as np
+
+
+class QTable :
+
+    def __init__(self, model:CompiledGridWorld ):
+
+        self.n_states:int  = model.n_states
+        self.n_actions:int = model.n_actions
+
+        self.Q:np.ndarray = np.zeros((model.n_states, model.n_actions))
+        self.N:np.ndarray = np.zeros((model.n_states, model.n_actions), dtype=np.int64)
+        self.C:np.ndarray = np.zeros((model.n_states, model.n_actions))
+        self.mask:np.ndarray = model.mask.copy()
+
+
+    # Batched incremental means: averaging every return G of (states[i], actions[i]) into Q.
+    # Returns are scattered per (s,a) first, so a whole batch of episodes is one update:
+    #   N' = N + n  ,  Q' = Q + ( sum(G) - n Q ) / N'
+    # Returns the touched state ids.
+    #-------------------------------------------------------------------------------------------
+    def update(self, states:np.ndarray, actions:np.ndarray, returns:np.ndarray) -> np.ndarray :
+
+        keys, inverse = np.unique( np.asarray(states)*self.n_actions + np.asarray(actions), return_inverse=True )
+        counts = np.bincount(inverse)
+        sums = np.bincount(inverse, weights=returns)
+
+        Q, N = self.Q.reshape(-1), self.N.reshape(-1)           # views
+        N[keys] += counts
+        Q[keys] += (sums - counts*Q[keys]) / N[keys]
+
+        return np.unique(keys // self.n_actions)
+
+
+    # Batched weighted-importance-sampling means: returns G of (states[i], actions[i]) with weights W.
+    #   C' = C + sum(W)  ,  Q' = Q + ( sum(W G) - sum(W) Q ) / C'
+    # Zero weights change nothing and are skipped ( N counts the weighted returns ).
+    # Returns the touched state ids.
+    #----------------------------------------------------------------------------------------------------
+    def update_weighted(self, states:np.ndarray, actions:np.ndarray, returns:np.ndarray, weights:np.ndarray) -> np.ndarray :
+
+        weights = np.asarray(weights)
+        keep = weights > 0
+        keys, inverse = np.unique( np.asarray(states)[keep]*self.n_actions + np.asarray(actions)[keep], return_inverse=True )
+        counts = np.bincount(inverse, minlength=len(keys))
+        w_sums = np.bincount(inverse, weights=weights[keep], minlength=len(keys))
+        wg_sums = np.bincount(inverse, weights=weights[keep]*np.asarray(returns)[keep], minlength=len(keys))
+
+        Q, N, C = self.Q.reshape(-1), self.N.reshape(-1), self.C.reshape(-1)       # views
+        N[keys] += counts
+        C[keys] += w_sums
+        Q[keys] += (wg_sums - w_sums*Q[keys]) / C[keys]
+
+        return np.unique(keys // self.n_actions)
+
+
+    # Greedy action ids of the states ( default: all ) -> -1 for no available action.
+    #-----------------------------------------------------------------------------------
+    def greedy(self, states:np.ndarray=None) -> np.ndarray :
+
+        Q, mask = (self.Q, self.mask) if states is None else (self.Q[states], self.mask[states])
+        return np.where( mask.any(axis=1), np.where(mask, Q, -np.inf).argmax(axis=1), -1 )
+
+
+    # Epsilon-greedy pi(a|s) of the states ( default: all ) -> probs[n,A].
+    #   greedy action: 1 - epsilon + epsilon/|A(s)|  ,  other available actions: epsilon/|A(s)|
+    #---------------------------------------------------------------------------------------------
+    def epsilon_greedy(self, epsilon:float, states:np.ndarray=None) -> np.ndarray :
+
+        mask = self.mask if states is None else self.mask[states]
+        counts = mask.sum(axis=1, keepdims=True)
+
+        probs = np.divide( epsilon*mask, counts, out=np.zeros(mask.shape), where=counts > 0 )
+        greedy = self.greedy(states)
+        rows = np.flatnonzero(greedy >= 0)
+        probs[rows, greedy[rows]] += 1 - epsilon
+
+        return probs
+
+
+    # { (state,"act"):Q } of the available actions ( print_q_func ).
+    #------------------------------------------------------------------
+    def to_dict(self, cols:int) -> dict :
+        return { ( (int(s)//cols, int(s)%cols), ACTIONS[a] ):float(self.Q[s,a]) for s, a in zip(*np.nonzero(self.mask)) }
+
+
+    def nbytes(self) -> int :
+        return self.Q.nbytes + self.N.nbytes + self.C.nbytes + self.mask.nbytes
+
+
+
+# Returns of one episode to average into Q, in linear time:
+#   G(t) = R(t+1) + gamma G(t+1) by one backward pass,
+#   first-visit -> only the first step of each (s,a) key, tracked by a visited bitmap over the key ids.
+# keys[t] = s*A + a of step t , rewards[t+1] is gained by step t ( rewards[0] is the start's -0- ).
+# Returns the averaged steps & their returns.
+#-----------------------------------------------------------------------------------------------------------
+def episode_returns( keys:list, rewards:list, gamma:float, n_keys:int, every_visit:bool=False ) -> tuple :
+
+    returns = [0.0]*len(keys)
+    g = 0.0
+    for t in range( len(keys)-1, -1, -1 ):
+        g = rewards[t+1] + gamma*g
+        returns[t] = g
+
+    if every_visit :
+        return list(range(len(keys))), returns
+
+    visited = bytearray(n_keys)
+    steps = []
+    for t, key in enumerate(keys):
+        if not visited[key] :
+            visited[key] = 1
+            steps.append(t)
+
+    return steps, [ returns[t] for t in steps ]
@@ -1,6 +1,11 @@
 
 import pickle
-from numpy import random
+import numpy as np
+from Compiled_Grid_World import CompiledGridWorld, UniformBuffer, ACTIONS, ACTION_IDS
+
+
+# __draw() result of an available action without transition probabilities -> stays, reward 0.
+NO_PROBS = -2
 
 # Stochastic Grid-world class:
 #---------------------------------------------------------------
@@ -9,7 +14,7 @@ from numpy import random
 # Deterministic rewards -> you will get same-reward from any way you reach s' form s.
 class GridWorld :
     
-    def __init__(self, rows, cols, start_state):
+    def __init__(self, rows, cols, start_state, seed:int=None):
         
         self.cols:int = cols
         self.rows:int = rows
@@ -29,6 +34,16 @@ class GridWorld :
         
         self.probabilities: dict = {} 
         
+        # Compiled model cache -> dropped by set_config.
+        self.__model: CompiledGridWorld = None
+        
+        # Alias-table sampler of transition() -> rebuilt by set_config.
+        self.__sampler: tuple = None
+        
+        # Per-environment random generator, drawn through a buffer of uniforms.
+        self.rng = np.random.default_rng(seed)
+        self.__uniforms = UniformBuffer(self.rng)
+        
         # Probabilities:  key -> ( state, "action" )     |    value -> { "next-state":prob, "next-state2":prob }
         self.__initialize_states()
         
@@ -43,23 +58,90 @@ class GridWorld :
     # Environment Transition function: T(s,a)-> r,s'
     #-----------------------------------------------
     def transition(self, action:str ) -> float :
+        return self.transition_id( ACTION_IDS.get(action,-1) )
+    
+    
+    # Id Transition function: T(s,a)-> r,s' by the alias table of (s,a) ( a = action id ).
+    #---------------------------------------------------------------------------------------
+    def transition_id(self, a:int ) -> float :
         
-        if action not in self.get_actions(self.current_state):
+        s = self.__draw( self.state_id(self.current_state), a, self.__uniforms.next )
+        if s == NO_PROBS :
+            return 0.0
+        if s < 0 :
             return self.__invalid_action_reward
         
-        next_state_probs:dict = self.probabilities.get( (self.current_state,action),{} )
+        self.current_state = self.state_of(s)
+        return self.__sampler[1][s]                                 # R(s')
+    
+    
+    # Stateless step: (state, "act") -> (next_state, reward, done) , sampled by the given rng.
+    # Never touches current_state or the env's generator -> one env can serve many concurrent rollouts.
+    #-----------------------------------------------------------------------------------------------------
+    def step(self, state:tuple, action:str, rng:np.random.Generator ) -> tuple :
         
-        if next_state_probs == {} : 
-            return 0.0
+        s, reward, done = self.step_id( self.state_id(state), ACTION_IDS.get(action,-1), rng )
+        return self.state_of(s), reward, done
+    
+    
+    # Stateless id step: (s, a) -> (s', reward, done). unavailable action -> stays, reward invalid-action reward
+    # ( 0 for an available action without probabilities ).
+    #----------------------------------------------------------------------------------------------
+    def step_id(self, s:int, a:int, rng:np.random.Generator ) -> tuple :
         
-        next_states = list(next_state_probs.keys())
-        next_probs  = list(next_state_probs.values())
+        next_s = self.__draw(s, a, rng.random)
+        _, R, _, _, _, _, terminal, _ = self.__sampler
         
-        index_list = [ i for i in range(len(next_states)) ]
-        index = random.choice(index_list, p=next_probs)
-        self.current_state = next_states[index]
+        if next_s < 0 :
+            return s, 0.0 if next_s == NO_PROBS else self.__invalid_action_reward, terminal[s]
         
-        return self.rewards.get(self.current_state,0.0)
+        return next_s, R[next_s], terminal[next_s]
+    
+    
+    # Alias draw of (s,a) by uniform() -> next state id, -1 for an unavailable action,
+    # NO_PROBS for an available action without transition probabilities.
+    #-------------------------------------------------------------------------------------
+    def __draw(self, s:int, a:int, uniform ) -> int :
+        
+        if self.__sampler is None :
+            self.__sampler = self.__build_sampler()
+        mask, _, indptr, indices, alias_prob, alias_next, _, listed = self.__sampler
+        
+        if not ( 0 <= a < len(ACTIONS) and mask[s][a] ) :
+            return NO_PROBS if 0 <= a < len(ACTIONS) and listed[s][a] else -1
+        
+        row = s*len(ACTIONS) + a
+        lo = indptr[row]
+        u = uniform() * (indptr[row+1] - lo)
+        k = lo + int(u)
+        
+        return indices[k] if u - int(u) < alias_prob[k] else alias_next[k]
+    
+    
+    # Compiled arrays & alias tables as plain lists -> cheap scalar access per step.
+    # [NOTE]: probabilities are validated & normalized here, once per set_config.
+    #--------------------------------------------------------------------------------
+    def __build_sampler(self) -> tuple :
+        
+        model = self.compile()
+        alias_prob, alias_next = model.alias()
+        
+        # actions of the actions dict ( the model's mask also drops the ones without probabilities ).
+        listed = np.zeros(model.mask.shape, dtype=bool)
+        for state, acts in self.actions.items():
+            for act in acts:
+                if act in ACTION_IDS :
+                    listed[ self.state_id(state), ACTION_IDS[act] ] = True
+        
+        return ( model.mask.tolist(), model.R.tolist(), model.P.indptr.tolist(), model.P.indices.tolist(),
+                 alias_prob.tolist(), alias_next.tolist(), model.terminal.tolist(), listed.tolist() )
+    
+    
+    # Reseeding the environment's random generator.
+    #-----------------------------------------------
+    def seed(self, seed:int=None )->None:
+        self.rng = np.random.default_rng(seed)
+        self.__uniforms = UniformBuffer(self.rng)
     
     
     # Environment Transition Probability function: p(s',r|s,a)-> [0,1]
@@ -85,6 +167,27 @@ class GridWorld :
             return 0.0
     
     
+    # ======== Integer ids:  s = i*cols + j  ,  a = index in ACTIONS =========
+    
+    def state_id(self, state:tuple) -> int:
+        return state[0]*self.cols + state[1]
+    
+    def state_of(self, s:int) -> tuple:
+        return (int(s)//self.cols, int(s)%self.cols)
+    
+    def action_id(self, action:str) -> int:
+        return ACTION_IDS.get(action,-1)
+    
+    def action_of(self, a:int) -> str:
+        return ACTIONS[a]
+    
+    # Available action ids of state id s ( default: current state ).
+    def get_action_ids(self, s:int=None) -> np.ndarray:
+        if s is None :
+            s = self.state_id(self.current_state)
+        return np.flatnonzero( self.compile().mask[s] )
+    
+    
     # Some God Mode methods prototype
     #---------------------------------
     def is_terminal(self, state ):
@@ -94,8 +197,16 @@ class GridWorld :
             return False
     
     def undo_action(self, action)->None: raise NotImplementedError
-    def get_next_state(self,state,action): raise NotImplementedError
-    def set_state(self, new_state)->None: raise NotImplementedError
+    
+    # Sampled next state of (state,"act") -> rng defaults to the env's own generator.
+    def get_next_state(self, state, action, rng:np.random.Generator=None ):
+        return self.step(state, action, self.rng if rng is None else rng)[0]
+    
+    # Moving the agent to new_state ( an in-grid state ).
+    def set_state(self, new_state)->None:
+        if not ( 0 <= new_state[0] < self.rows and 0 <= new_state[1] < self.cols ) :
+            raise ValueError(f"state out of grid: {new_state}")
+        self.current_state = tuple(new_state)
     #=================================
     
     # Game-over check-method.
@@ -113,6 +224,35 @@ class GridWorld :
         self.actions = actions
         self.rewards = rewards
         self.probabilities = probs
+        self.__model = None
+        self.__sampler = self.__build_sampler()
+    
+    
+    # Pickles of older GridWorlds lack the compiled caches & the generator -> defaults.
+    #-------------------------------------------------------------------------------------
+    def __setstate__(self, state:dict)->None:
+        
+        self.__dict__.update(state)
+        self.__dict__.setdefault("_GridWorld__model", None)
+        self.__dict__["_GridWorld__sampler"] = None                    # cache of any layout -> rebuilt on first transition
+        if "rng" not in self.__dict__ :
+            self.seed()
+    
+    
+    # Compiling grid-world into transition & reward arrays (cached until next set_config).
+    #-------------------------------------------------------------------------------------
+    def compile(self) -> CompiledGridWorld :
+        
+        if self.__model is None :
+            
+            outcomes = {}
+            for state, acts in self.actions.items():
+                for act in acts:
+                    outcomes[(state,act)] = self.probabilities.get((state,act),{})
+            
+            self.__model = CompiledGridWorld.from_dicts( self.rows, self.cols, self.rewards, outcomes )
+        
+        return self.__model
     
     
     # Initialize Grid-world States.
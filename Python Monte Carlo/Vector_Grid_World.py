@@ -0,0 +1,141 @@
+# -------------------------------------------------------
+
+# Vectorized Grid-World: K episodes stepped at once over the compiled model of a stochastic GridWorld.
+# Every step samples K actions from the policy and K next states from the alias tables in one
+# NumPy call each, and finished episodes are restarted in place ( auto-reset ).
+#
+#   policy : int array pi[S]        -> deterministic  ( action id, -1 for no action )
+#            float array pi[S,A]    -> stochastic     ( pi(a|s) over action ids )
+
+# -------------------------------------------------------
+
+from Stochastic_Grid_world import GridWorld
+from Compiled_Grid_World import CompiledGridWorld, ACTION_IDS
+import numpy as np
+import time
+
+
+class VectorGridWorld :
+
+    def __init__(self, env:GridWorld, n_envs:int, start:tuple=None, max_steps:int=None,
+                 invalid_reward:float=-10000, seed:int=None ):
+
+        self.model:CompiledGridWorld = env.compile()
+        self.n_envs:int = n_envs
+        self.max_steps:int = max_steps                     # None -> episodes end on terminal states only
+        self.invalid_reward:float = invalid_reward         # same as GridWorld's invalid-action reward
+
+        self.rng = np.random.default_rng(seed)
+
+        # Starting states: a fixed state, or uniform over non-terminal states.
+        if start is not None :
+            self.starts:np.ndarray = np.array([ self.model.state_id(start) ])
+        else :
+            self.starts:np.ndarray = np.flatnonzero(~self.model.terminal)
+
+        self.states:np.ndarray = np.zeros(n_envs, dtype=np.int64)     # current state ids
+        self.steps:np.ndarray  = np.zeros(n_envs, dtype=np.int64)     # steps of the running episodes
+        self.episodes:int = 0                                          # finished episodes
+
+        self.reset()
+
+
+    # Restarting episodes of the given env indexes ( default: all ) -> current state ids.
+    #--------------------------------------------------------------------------------------
+    def reset(self, idx:np.ndarray=None) -> np.ndarray :
+
+        if idx is None :
+            idx = np.arange(self.n_envs)
+
+        self.states[idx] = self.starts[ self.rng.integers(len(self.starts), size=len(idx)) ]
+        self.steps[idx] = 0
+
+        return self.states
+
+
+    # K actions of the current states by the policy ( one draw per env ).
+    #-----------------------------------------------------------------------
+    def sample_actions(self, policy:np.ndarray) -> np.ndarray :
+
+        if policy.ndim == 1 :
+            return policy[self.states]
+
+        cum = policy[self.states].cumsum(axis=1)
+        u = self.rng.random(self.n_envs) * cum[:,-1]
+        return np.minimum( (cum <= u[:,None]).sum(axis=1), self.model.n_actions-1 )
+
+
+    # One step of all K episodes -> (next_states, rewards, terminated, truncated).
+    # next_states are the reached states; the finished envs then restart from a new starting state.
+    # Unavailable actions stay in place with invalid_reward.
+    #---------------------------------------------------------------------------------------------------
+    def step(self, actions:np.ndarray) -> tuple :
+
+        model = self.model
+        actions = np.asarray(actions)
+
+        valid = actions >= 0
+        valid[valid] = model.mask[ self.states[valid], actions[valid] ]
+
+        next_states = self.states.copy()
+        rows = self.states[valid]*model.n_actions + actions[valid]
+        next_states[valid] = model.sample_next( rows, self.rng.random(len(rows)) )
+
+        rewards = np.where( valid, model.R[next_states], self.invalid_reward )
+
+        self.steps += 1
+        terminated = model.terminal[next_states]
+        if self.max_steps is not None :
+            truncated = ~terminated & (self.steps >= self.max_steps)
+        else :
+            truncated = np.zeros(self.n_envs, dtype=bool)
+
+        self.states = next_states.copy()
+        done = np.flatnonzero(terminated | truncated)
+        self.reset(done)
+        self.episodes += len(done)
+
+        return next_states, rewards, terminated, truncated
+
+
+    # Dict policies of the MC scripts -> policy arrays.
+    #   { state:"act" } -> pi[S]  ,  { state:{ "act":prob } } -> pi[S,A]
+    #------------------------------------------------------------------------
+    def policy_array(self, policy:dict) -> np.ndarray :
+
+        if all( isinstance(act, str) for act in policy.values() ) :
+            return self.model.policy_array(policy)
+
+        probs = np.zeros((self.model.n_states, self.model.n_actions))
+        for state, act_probs in policy.items():
+            for act, p in act_probs.items():
+                probs[ self.model.state_id(state), ACTION_IDS[act] ] = p
+
+        return probs
+
+
+    # Uniform random policy over the available actions -> pi[S,A].
+    #----------------------------------------------------------------
+    def uniform_policy(self) -> np.ndarray :
+
+        counts = self.model.mask.sum(axis=1, keepdims=True)
+        return np.divide( self.model.mask, counts, out=np.zeros(self.model.mask.shape), where=counts > 0 )
+
+
+
+
+# Test Space :
+#-----------------------
+if __name__ == "__main__" :
+
+    from Stochastic_Grid_world import standard_sticky_GW
+
+    venv = VectorGridWorld( standard_sticky_GW(-0.09), n_envs=10000, max_steps=20, seed=0 )
+    policy = venv.uniform_policy()
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        venv.step( venv.sample_actions(policy) )
+    seconds = time.perf_counter() - start
+
+    print("> episodes: %d  |  %.0f episodes/s"%( venv.episodes, venv.episodes/seconds ))
@@ -0,0 +1,638 @@
+import json
+import struct
+import numpy as np
+from scipy import sparse
+
+# Compiled Grid-world model:
+#---------------------------------------------------------------
+
+# Array form of a grid-world, built once by GridWorld.compile() and shared by every solver.
+#   state id  : s = i*cols + j
+#   action id : a = index in ACTIONS
+#   P         : CSR matrix, row (s*A + a) holds p(s'|s,a) over next-state ids.
+#   R         : reward of reaching s'  ( rewards are given on arrival, like GridWorld.rewards )
+#   mask      : mask[s,a] is True if action a is available in state s.
+#   next_state: deterministic models only ( else None ) -> next_state[s,a] = s' id, -1 for unavailable actions.
+ACTIONS = ["U","D","L","R"]
+ACTION_IDS = { act:a for a, act in enumerate(ACTIONS) }
+
+
+class CompiledGridWorld :
+
+    def __init__(self, rows:int, cols:int, P, R, mask):
+
+        self.rows:int = rows
+        self.cols:int = cols
+
+        self.n_states:int  = rows*cols
+        self.n_actions:int = len(ACTIONS)
+        self.actions:list  = ACTIONS
+
+        self.P = sparse.csr_matrix(P)                           # (S*A, S)
+        self.R:np.ndarray = np.asarray(R, dtype=np.float64)     # (S,)
+        self.mask:np.ndarray = np.asarray(mask, dtype=bool)     # (S,A)
+
+        # Terminal states have no available action.
+        self.terminal:np.ndarray = ~self.mask.any(axis=1)
+
+        # Next-state table of deterministic models -> backups become gathers.
+        self.next_state:np.ndarray = self.__next_state_table()
+
+        # Reverse transitions & alias tables, built on first use.
+        self.__predecessors = None
+        self.__alias = None
+
+
+
+    # Building model from GridWorld-style dicts.
+    # outcomes = { (state,"act"): { next_state:prob } }
+    #---------------------------------------------------
+    @classmethod
+    def from_dicts(cls, rows:int, cols:int, rewards:dict, outcomes:dict ):
+
+        n_actions = len(ACTIONS)
+
+        R = np.zeros(rows*cols)
+        for (i,j), reward in rewards.items():
+            R[i*cols + j] = reward
+
+        mask = np.zeros((rows*cols, n_actions), dtype=bool)
+        sa_ids, next_ids, probs = [], [], []
+
+        for ((i,j), act), next_probs in outcomes.items():
+
+            if act not in ACTIONS or not next_probs :
+                continue
+
+            s = i*cols + j
+            a = ACTION_IDS[act]
+            mask[s,a] = True
+
+            for (ni,nj), p in next_probs.items():
+                sa_ids.append(s*n_actions + a)
+                next_ids.append(ni*cols + nj)
+                probs.append(p)
+
+        P = sparse.coo_matrix( (probs,(sa_ids,next_ids)), shape=(rows*cols*n_actions, rows*cols) )
+        return cls(rows, cols, P.tocsr(), R, mask)
+
+
+    # Index helpers:  (i,j) <-> s  ,  "act" <-> a   ( unknown action -> -1 )
+    #------------------------------------------------------------------------
+    def state_id(self, state:tuple) -> int:
+        return state[0]*self.cols + state[1]
+
+    def state_of(self, s:int) -> tuple:
+        return (int(s)//self.cols, int(s)%self.cols)
+
+    def action_id(self, action:str) -> int:
+        return ACTION_IDS.get(action, -1)
+
+    def action_of(self, a:int) -> str:
+        return ACTIONS[a]
+
+
+    # Batched index helpers:  [ (i,j) ] <-> ids array  ,  [ "act" ] -> ids array
+    #-----------------------------------------------------------------------------
+    def state_ids(self, states) -> np.ndarray:
+
+        states = np.asarray(states, dtype=np.int64).reshape(-1, 2)
+        return states[:,0]*self.cols + states[:,1]
+
+    def states_of(self, ids) -> list:
+
+        ids = np.asarray(ids, dtype=np.int64)
+        return list( zip( (ids // self.cols).tolist(), (ids % self.cols).tolist() ) )
+
+    def action_ids(self, actions) -> np.ndarray:
+        return np.array( [ ACTION_IDS.get(act, -1) for act in actions ], dtype=np.int64 )
+
+
+    # Outcomes of (s,a): next-state ids & probabilities ( a view on the CSR row ).
+    #-------------------------------------------------------------------------------
+    def outcomes(self, s:int, a:int):
+
+        row = s*self.n_actions + a
+        lo, hi = self.P.indptr[row], self.P.indptr[row+1]
+        return self.P.indices[lo:hi], self.P.data[lo:hi]
+
+
+    # next_state[s,a] if every available (s,a) row is one s' with probability 1, else None.
+    #---------------------------------------------------------------------------------------
+    def __next_state_table(self):
+
+        counts = np.diff(self.P.indptr).reshape(self.n_states, self.n_actions)
+        if np.any( counts != self.mask ) or np.any( self.P.data != 1.0 ) :
+            return None
+
+        next_state = np.full((self.n_states, self.n_actions), -1, dtype=np.int64)
+        next_state[self.mask] = self.P.indices             # one entry per available (s,a), in row order
+        return next_state
+
+
+    # Predecessor index ( reverse adjacency ): CSR of shape (S, S*A),
+    # row s' holds the (s*A + a) ids with p(s'|s,a) > 0 and those probabilities.
+    #----------------------------------------------------------------------------
+    def predecessors(self):
+
+        if self.__predecessors is None :
+            self.__predecessors = self.P.transpose().tocsr()
+            self.__predecessors.eliminate_zeros()
+
+        return self.__predecessors
+
+
+    # Walker alias tables of the P rows ( cached ) -> (alias_prob, alias_next), aligned with P.data.
+    #------------------------------------------------------------------------------------------------
+    def alias(self):
+
+        if self.__alias is None :
+            self.__alias = alias_tables(self.P)
+
+        return self.__alias
+
+
+    # Sampling next-state ids of the CSR rows (s*A + a) by uniforms u in [0,1) -> one alias draw per row.
+    # rows must be available (s,a) rows ( mask[s,a] is True ).
+    #----------------------------------------------------------------------------------------------------
+    def sample_next(self, rows:np.ndarray, u:np.ndarray) -> np.ndarray:
+
+        alias_prob, alias_next = self.alias()
+        lo = self.P.indptr[rows]
+        n = self.P.indptr[rows+1] - lo
+
+        u = u * n
+        i = np.minimum( u.astype(np.int64), n-1 )
+        k = lo + i
+
+        return np.where( u - i < alias_prob[k], self.P.indices[k], alias_next[k] )
+
+
+    # One batched Bellman backup: Q(s,a) = sum P(s'|s,a) [ R(s') + gamma V(s') ]
+    # Unavailable actions are set to -inf.
+    #----------------------------------------------------------------------------
+    def backup(self, V:np.ndarray, gamma:float) -> np.ndarray:
+
+        target = self.R + gamma*V
+
+        if self.next_state is not None :                    # deterministic -> gather target[s']
+            return np.where(self.mask, target[self.next_state], -np.inf)
+
+        Q = (self.P @ target).reshape(self.n_states, self.n_actions)
+        Q[~self.mask] = -np.inf
+        return Q
+
+
+    # Policy-induced model:  P_pi(s'|s) = P(s'|s,pi(s))  ,  r_pi(s) = sum P_pi(s'|s) R(s')
+    # States without an available policy action get an empty row ( V=0 ).
+    #----------------------------------------------------------------------------------------
+    def policy_model(self, policy:np.ndarray):
+
+        policy = np.asarray(policy)
+        states = np.flatnonzero(policy >= 0)
+        states = states[ self.mask[states, policy[states]] ]
+
+        select = sparse.csr_matrix( ( np.ones(len(states)), (states, states*self.n_actions + policy[states]) ),
+                                    shape=(self.n_states, self.n_states*self.n_actions) )
+        P_pi = (select @ self.P).tocsr()
+
+        return P_pi, P_pi @ self.R
+
+
+    # Policy next-state ids of a deterministic model:  s' = next_state[s,pi(s)] , -1 without an available policy action.
+    #------------------------------------------------------------------------------------------------------------------
+    def policy_next(self, policy:np.ndarray) -> np.ndarray:
+
+        if self.next_state is None :
+            raise ValueError("policy_next() needs a deterministic model")
+
+        policy = np.asarray(policy)
+        valid = policy >= 0
+        valid[valid] = self.mask[ np.flatnonzero(valid), policy[valid] ]
+
+        next_ids = np.full(self.n_states, -1, dtype=np.int64)
+        next_ids[valid] = self.next_state[ np.flatnonzero(valid), policy[valid] ]
+        return next_ids
+
+
+    # Greedy V(s) & policy from a Q table -> terminal states get V=0 and action -1.
+    #-------------------------------------------------------------------------------
+    def greedy(self, Q:np.ndarray):
+
+        policy = np.where(self.terminal, -1, Q.argmax(axis=1))
+        V = np.where(self.terminal, 0.0, Q.max(axis=1))
+        return V, policy
+
+
+    # Conversions to GridWorld-style dicts ( print_value / print_policy ).
+    #----------------------------------------------------------------------
+    def value_dict(self, V:np.ndarray) -> dict:
+        return { self.state_of(s):float(V[s]) for s in range(self.n_states) }
+
+    def value_array(self, V:dict) -> np.ndarray:
+
+        values = np.zeros(self.n_states)
+        for state, v in V.items():
+            values[self.state_id(state)] = v
+        return values
+
+    def policy_dict(self, policy:np.ndarray) -> dict:
+        return { self.state_of(s):ACTIONS[a] for s, a in enumerate(policy) if a >= 0 }
+
+    def policy_array(self, policy:dict) -> np.ndarray:
+
+        actions = np.full(self.n_states, -1, dtype=np.int64)
+        for state, act in policy.items():
+            actions[self.state_id(state)] = ACTION_IDS.get(act, -1)
+        return actions
+
+
+
+# Walker alias tables ( Vose's method ) of the CSR rows of P:
+# a row with n outcomes is n equal buckets; bucket k keeps outcome k by alias_prob[k], else goes to alias_next[k].
+#   draw -> u*n = bucket + frac  :  next = P.indices[k] if frac < alias_prob[k] else alias_next[k]
+# Rows are validated ( p >= 0 , sum 1 within ALIAS_TOL ) and normalized once here.
+#---------------------------------------------------------------------------------------------------------------------
+ALIAS_TOL = 1e-8
+
+def alias_tables(P):
+
+    P = sparse.csr_matrix(P)
+    indptr, indices = P.indptr, P.indices
+    counts = np.diff(indptr)
+
+    if np.any(P.data < 0) :
+        raise ValueError("negative transition probability")
+
+    sums = np.asarray(P.sum(axis=1)).ravel()
+    bad = np.flatnonzero( (counts > 0) & (np.abs(sums - 1.0) > ALIAS_TOL) )
+    if len(bad) :
+        raise ValueError(f"transition probabilities of row {bad[0]} sum to {sums[bad[0]]}")
+
+    scaled = P.data / np.repeat(sums, counts) * np.repeat(counts, counts)      # mean 1 per row
+
+    alias_prob = np.ones(len(P.data))
+    alias_next = np.array(indices, dtype=np.int64)
+
+    # two outcomes ( sticky moves ) -> the smaller one borrows from the larger one.
+    two = indptr[:-1][counts == 2]
+    small = np.where( scaled[two] <= scaled[two+1], two, two+1 )
+    large = 2*two + 1 - small
+    alias_prob[small] = scaled[small]
+    alias_next[small] = indices[large]
+
+    # more outcomes -> Vose's small / large worklists per row.
+    for row in np.flatnonzero(counts > 2):
+
+        lo = indptr[row]
+        p = scaled[ lo:indptr[row+1] ].tolist()
+        small = [ k for k, q in enumerate(p) if q < 1.0 ]
+        large = [ k for k, q in enumerate(p) if q >= 1.0 ]
+
+        while small and large :
+            l, g = small.pop(), large[-1]
+            alias_prob[lo+l], alias_next[lo+l] = p[l], indices[lo+g]
+
+            p[g] += p[l] - 1.0
+            if p[g] < 1.0 :
+                small.append( large.pop() )
+
+    return alias_prob, alias_next
+
+
+# Buffered uniforms of a numpy Generator -> one rng call per block of draws.
+#----------------------------------------------------------------------------
+class UniformBuffer :
+
+    def __init__(self, rng:np.random.Generator, block:int=4096):
+
+        self.rng = rng
+        self.block:int = block
+        self.__values:list = []
+        self.__pos:int = 0
+
+    def next(self) -> float :
+
+        if self.__pos == len(self.__values) :
+            self.__values = self.rng.random(self.block).tolist()
+            self.__pos = 0
+
+        self.__pos += 1
+        return self.__values[self.__pos-1]
+
+
+
+# Layout Grid-World -> compiled arrays, the convention of standard_GW / standard_sticky_GW:
+#   walls & terminal cells have no actions, walls are never entered.
+#   an action is available if it moves into an in-grid, non-wall cell.
+#   every available move succeeds by 1-slip and stays in place by slip.
+# Optional exceptions:  actions = { s:[a,..] }  ,  transitions = { s*A+a:( [next ids], [probs] ) }
+#-----------------------------------------------------------------------------------------------------
+def layout_model( rows:int, cols:int, walls:np.ndarray, terminals:np.ndarray, R:np.ndarray, slip:float=0.0,
+                  actions:dict=None, transitions:dict=None ) -> CompiledGridWorld :
+
+    n_states, n_actions = rows*cols, len(ACTIONS)
+    walls, terminals = np.asarray(walls, dtype=bool), np.asarray(terminals, dtype=bool)
+
+    i, j = np.divmod( np.arange(n_states), cols )
+    mask = np.zeros((n_states, n_actions), dtype=bool)
+    next_state = np.zeros((n_states, n_actions), dtype=np.int64)
+
+    for a, (di,dj) in enumerate( [ (-1,0), (1,0), (0,-1), (0,1) ] ):        # U, D, L, R
+
+        ni, nj = i+di, j+dj
+        inside = (ni >= 0) & (ni < rows) & (nj >= 0) & (nj < cols)
+        target = np.where(inside, ni*cols + nj, 0)
+
+        mask[:,a] = ~walls & ~terminals & inside & ~walls[target]
+        next_state[:,a] = target
+
+    for s, acts in (actions or {}).items():
+        mask[s] = False
+        mask[s, list(acts)] = True
+
+    transitions = transitions or {}
+    sa = np.flatnonzero(mask.ravel())
+    sa = sa[ ~np.isin(sa, list(transitions)) ]
+    s = sa // n_actions
+    moves = next_state.ravel()[sa]
+
+    if slip > 0 :
+        sa_ids   = [ sa, sa ]
+        next_ids = [ moves, s ]
+        probs    = [ np.full(len(sa), 1.0-slip), np.full(len(sa), slip) ]
+    else :
+        sa_ids, next_ids, probs = [ sa ], [ moves ], [ np.ones(len(sa)) ]
+
+    for row, (nexts, ps) in transitions.items():
+        if mask.ravel()[row] :
+            sa_ids.append( np.full(len(nexts), row) )
+            next_ids.append( np.asarray(nexts, dtype=np.int64) )
+            probs.append( np.asarray(ps, dtype=np.float64) )
+
+    P = sparse.csr_matrix( ( np.concatenate(probs), (np.concatenate(sa_ids), np.concatenate(next_ids)) ),
+                           shape=(n_states*n_actions, n_states) )
+    return CompiledGridWorld(rows, cols, P, R, mask)
+
+
+# Procedural Grid-World generator -> compiled arrays directly, no per-cell dicts.
+#   wall_density : probability of a cell being a wall ( no actions, never entered ).
+#   goals, holes : number of terminal cells with goal_reward / hole_reward.
+#   cost         : arrival reward of every other cell.
+#   slip         : probability of staying in place ( sticky moves ), 0 -> deterministic.
+#-----------------------------------------------------------------------------------------
+def random_grid( rows:int, cols:int, wall_density:float=0.1, goals:int=1, holes:int=1, cost:float=-0.04,
+                 slip:float=0.0, goal_reward:float=1.0, hole_reward:float=-1.0, seed=None ) -> CompiledGridWorld :
+
+    rng = np.random.default_rng(seed)
+    n_states = rows*cols
+
+    walls = rng.random(n_states) < wall_density
+    free = np.flatnonzero(~walls)
+    if goals + holes > len(free) :
+        raise ValueError(f"{goals+holes} terminal cells do not fit in {len(free)} free cells")
+
+    chosen = rng.choice(free, size=goals+holes, replace=False)
+    terminals = np.zeros(n_states, dtype=bool)
+    terminals[chosen] = True
+
+    R = np.full(n_states, cost, dtype=np.float64)
+    R[walls] = 0.0
+    R[chosen[:goals]] = goal_reward
+    R[chosen[goals:]] = hole_reward
+
+    return layout_model(rows, cols, walls, terminals, R, slip)
+
+
+# Map file format:
+#   a JSON header, a "---" line, then one line of cols characters per grid row.
+#     "."            ordinary cell -> reward "cost"
+#     "#"            wall          -> reward 0, no actions, never entered
+#     other symbols  terminal cell -> reward header["symbols"][symbol]
+#   header = { "format":"gridworld-map", "version":1, "rows", "cols", "cost", "slip", "symbols",
+#              optional exceptions to the layout convention:
+#              "rewards":[ [i,j,r] ], "actions":[ [i,j,"UD"] ], "transitions":[ [i,j,"U",[ [ni,nj,p] ]] ] }
+#--------------------------------------------------------------------------------------------------------------
+MAP_FORMAT  = "gridworld-map"
+MAP_VERSION = 1
+
+
+# Loading a map file straight into a compiled Grid-World.
+#---------------------------------------------------------
+def load_map(filename) -> CompiledGridWorld :
+
+    with open(filename, 'r') as f:
+
+        header = []
+        for line in f:
+            if line.strip() == "---" :
+                break
+            header.append(line)
+
+        header = json.loads("".join(header))
+        if header.get("format") != MAP_FORMAT or header.get("version",0) > MAP_VERSION :
+            raise ValueError(f"{filename}: not a {MAP_FORMAT} v{MAP_VERSION} file")
+
+        rows, cols = header["rows"], header["cols"]
+        layout = np.frombuffer( "".join( line.rstrip("\r\n") for line in f ).encode("ascii"), dtype="S1" )
+
+    if layout.size != rows*cols :
+        raise ValueError(f"{filename}: layout has {layout.size} cells, header says {rows}x{cols}")
+
+    walls = layout == b"#"
+    terminals = ~walls & (layout != b".")
+
+    R = np.full(rows*cols, float(header.get("cost",0.0)))
+    R[walls] = 0.0
+    for symbol, reward in header.get("symbols",{}).items():
+        R[ layout == symbol.encode("ascii") ] = reward
+
+    unknown = terminals & ~np.isin(layout, [ sym.encode("ascii") for sym in header.get("symbols",{}) ])
+    if unknown.any() :
+        raise ValueError(f"{filename}: symbols without reward: {sorted(set(layout[unknown].astype(str)))}")
+
+    for i, j, reward in header.get("rewards",[]):
+        R[i*cols + j] = reward
+
+    n_actions = len(ACTIONS)
+    actions = { i*cols + j:[ ACTIONS.index(a) for a in acts ] for i, j, acts in header.get("actions",[]) }
+    transitions = {}
+    for i, j, act, nexts in header.get("transitions",[]):
+        transitions[ (i*cols + j)*n_actions + ACTIONS.index(act) ] = ( [ ni*cols + nj for ni, nj, _ in nexts ],
+                                                                      [ p for _, _, p in nexts ] )
+
+    return layout_model(rows, cols, walls, terminals, R, float(header.get("slip",0.0)), actions, transitions)
+
+
+# Exporting a GridWorld / compiled Grid-World into a map file.
+# Anything the layout convention can not express is written as header exceptions.
+#----------------------------------------------------------------------------------
+def save_map(model, filename) -> None :
+
+    if not isinstance(model, CompiledGridWorld) :       # a GridWorld ( deterministic or sticky )
+        model = model.compile()
+
+    rows, cols, n_actions = model.rows, model.cols, model.n_actions
+    reached = np.diff( model.predecessors().indptr ) > 0
+
+    walls = model.terminal & ~reached & (model.R == 0)
+    terminals = model.terminal & ~walls
+
+    # cost = most common reward of active cells, slip = most common stay-in-place probability.
+    active_R = model.R[~model.terminal]
+    values, counts = np.unique(active_R, return_counts=True)
+    cost = float(values[counts.argmax()]) if len(values) else 0.0
+
+    sa = np.flatnonzero(model.mask.ravel())
+    stay = np.asarray( model.P[sa, sa // n_actions] ).ravel()
+    values, counts = np.unique(stay, return_counts=True)
+    slip = float(values[counts.argmax()]) if len(values) else 0.0
+
+    # terminal symbols by reward: G for the best goal, H for the worst hole, then A, B, ...
+    # past Z, the remaining terminals are written as Z cells with a reward exception.
+    rewards = sorted( set(model.R[terminals].tolist()) )
+    symbols = {}
+    if rewards and rewards[-1] > 0 :
+        symbols["G"] = rewards.pop()
+    if rewards and rewards[0] <= 0 :
+        symbols["H"] = rewards.pop(0)
+    for symbol, reward in zip("ABCDEFIJKLMNOPQRSTUVWXYZ", rewards):
+        symbols[symbol] = reward
+
+    layout = np.full(rows*cols, ".", dtype="<U1")
+    layout[walls] = "#"
+    default_R = np.where(walls, 0.0, cost)
+    for symbol, reward in symbols.items():
+        layout[ terminals & (model.R == reward) ] = symbol
+        default_R[ terminals & (model.R == reward) ] = reward
+
+    extra = terminals & (layout == ".")
+    if extra.any() :
+        symbol = list(symbols)[-1]
+        layout[extra] = symbol
+        default_R[extra] = symbols[symbol]
+
+    default = layout_model(rows, cols, walls, terminals, model.R, slip)
+
+    header = { "format":MAP_FORMAT, "version":MAP_VERSION, "rows":rows, "cols":cols,
+               "cost":cost, "slip":slip, "symbols":symbols }
+
+    rewards = np.flatnonzero( model.R != default_R )
+    if len(rewards) :
+        header["rewards"] = [ [ int(s)//cols, int(s)%cols, float(model.R[s]) ] for s in rewards ]
+
+    actions = np.flatnonzero( (model.mask != default.mask).any(axis=1) )
+    if len(actions) :
+        header["actions"] = [ [ int(s)//cols, int(s)%cols, "".join( ACTIONS[a] for a in np.flatnonzero(model.mask[s]) ) ]
+                              for s in actions ]
+
+    overrides = np.flatnonzero( np.abs(model.P - default.P).sum(axis=1).A.ravel() > 1e-12 )
+    overrides = overrides[ model.mask.ravel()[overrides] ]
+    if len(overrides) :
+        header["transitions"] = []
+        for row in overrides:
+            s, a = divmod(int(row), n_actions)
+            lo, hi = model.P.indptr[row], model.P.indptr[row+1]
+            nexts = [ [ int(n)//cols, int(n)%cols, float(p) ] for n, p in zip(model.P.indices[lo:hi], model.P.data[lo:hi]) ]
+            header["transitions"].append( [ s//cols, s%cols, ACTIONS[a], nexts ] )
+
+    with open(filename, 'w') as f:
+        f.write( json.dumps(header) + "\n---\n" )
+        for i in range(rows):
+            f.write( "".join(layout[i*cols:(i+1)*cols]) + "\n" )
+
+
+# Binary model file format ( memory-mappable ):
+#   magic "GWMODEL\0" | version <u4 | header length <u4 | JSON header | arrays, each 64-byte aligned
+#   header = { "rows", "cols", "n_actions", "arrays":{ name:{ "dtype", "shape", "offset" } } }
+#   arrays : CSR "indptr" / "indices" / "data" of P, "R", "mask", and optionally "V", "policy", "Q".
+# All arrays are raw little-endian -> load_model maps the file once and returns zero-copy views,
+# so many processes can map the same solved model without holding a copy each.
+#--------------------------------------------------------------------------------------------------
+MODEL_MAGIC   = b"GWMODEL\0"
+MODEL_VERSION = 1
+MODEL_EXT     = ".gwm"
+MODEL_ALIGN   = 64
+
+
+# Is it a binary model file? ( pickle files are not )
+#------------------------------------------------------
+def is_model_file(filename) -> bool :
+    with open(filename, 'rb') as f:
+        return f.read(len(MODEL_MAGIC)) == MODEL_MAGIC
+
+
+# Saving compiled model & solution arrays ( V, policy, Q ... ) into a binary model file.
+#----------------------------------------------------------------------------------------
+def save_model(filename, model:CompiledGridWorld, **solution) -> None :
+
+    arrays = { "indptr":model.P.indptr, "indices":model.P.indices, "data":model.P.data, "R":model.R, "mask":model.mask }
+    arrays.update( { name:np.asarray(a) for name, a in solution.items() if a is not None } )
+
+    write_arrays( filename, MODEL_MAGIC, MODEL_VERSION,
+                  { "rows":model.rows, "cols":model.cols, "n_actions":model.n_actions }, arrays )
+
+
+# Loading a binary model file -> ( CompiledGridWorld, { "V", "policy", "Q", ... } )
+# arrays are read-only views on one np.memmap of the file ( lazy, zero-copy ).
+#------------------------------------------------------------------------------------
+def load_model(filename, mode:str="r"):
+
+    header, arrays = map_arrays( filename, MODEL_MAGIC, MODEL_VERSION, mode )
+
+    rows, cols, n_actions = header["rows"], header["cols"], header["n_actions"]
+    P = sparse.csr_matrix( (arrays.pop("data"), arrays.pop("indices"), arrays.pop("indptr")), shape=(rows*cols*n_actions, rows*cols) )
+    model = CompiledGridWorld( rows, cols, P, arrays.pop("R"), arrays.pop("mask") )
+
+    return model, arrays
+
+
+# Aligned arrays file, the layout of the binary formats:
+#   magic | version <u4 | header length <u4 | JSON header | arrays, each MODEL_ALIGN-byte aligned
+#   header["arrays"] = { name:{ "dtype", "shape", "offset" } }  ( offsets from the first array )
+#--------------------------------------------------------------------------------------------------
+def write_arrays(filename, magic:bytes, version:int, header:dict, arrays:dict) -> None :
+
+    arrays, specs, offset = dict(arrays), {}, 0
+    for name, a in arrays.items():
+        a = np.asarray(a)
+        dtype = a.dtype.newbyteorder("<") if a.dtype.itemsize > 1 else a.dtype
+        arrays[name] = np.ascontiguousarray(a, dtype=dtype)
+        specs[name] = { "dtype":dtype.str, "shape":list(a.shape), "offset":offset }
+        offset += -(-arrays[name].nbytes // MODEL_ALIGN) * MODEL_ALIGN
+
+    header = json.dumps( dict(header, arrays=specs) ).encode()
+    start = -(-( len(magic) + 8 + len(header) ) // MODEL_ALIGN) * MODEL_ALIGN
+
+    with open(filename, 'wb') as f:
+
+        f.write( magic + struct.pack("<II", version, len(header)) + header )
+        for name, a in arrays.items():
+            f.seek( start + specs[name]["offset"] )
+            f.write( a.tobytes() )
+        f.truncate( start + offset )
+
+
+# Mapping an aligned arrays file -> ( header, { name:array } ), views on one np.memmap.
+#-----------------------------------------------------------------------------------------
+def map_arrays(filename, magic:bytes, version:int, mode:str="r"):
+
+    with open(filename, 'rb') as f:
+
+        if f.read(len(magic)) != magic :
+            raise ValueError(f"{filename}: not a {magic.rstrip(bytes(1)).decode()} file")
+
+        file_version, length = struct.unpack("<II", f.read(8))
+        if file_version > version :
+            raise ValueError(f"{filename}: file version {file_version} is newer than {version}")
+
+        header = json.loads( f.read(length) )
+
+    start = -(-( len(magic) + 8 + length ) // MODEL_ALIGN) * MODEL_ALIGN
+    buffer = np.memmap(filename, dtype=np.uint8, mode=mode)
+
+    arrays = {}
+    for name, spec in header.pop("arrays").items():
+        arrays[name] = np.ndarray( tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=buffer, offset=start+spec["offset"] )
+
+    return header, arrays
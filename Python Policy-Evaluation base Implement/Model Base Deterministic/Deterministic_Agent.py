@@ -1,7 +1,12 @@
+import numpy as np
+from scipy import sparse
+from scipy.sparse import linalg
+from Compiled_Grid_World import CompiledGridWorld, ACTIONS, MODEL_EXT, save_model, load_model, is_model_file
+
 
 class Agent:
     
-    def __init__(self) -> None :
+    def __init__(self, evaluation:str="sweep") -> None :
         
         self.policy:dict = {}                      # Deterministic Agent_class policy    : { (i,j):action }
         self.value_state_function:dict = {}        # State-value function V(s)  : { (i,j):value  }
@@ -13,6 +18,8 @@ class Agent:
         self.__GAMMA   = 0.9                       # discount factor
         self.__MIN_ERROR = 1e-3                    # threshold
         
+        self.evaluation:str = evaluation           # policy evaluation mode : "sweep" | "direct" | "bicgstab"
+        
         self.model_states:list = []                # modeliment Visited States  : [ (i,j), (i',j') ]
         self.model_actions:list = []               # modeliment Done Actions    : [ "act1", "act2" ]
         self.model_rewards:dict = {}               # modeliment Gained rewards  : { (i,j):reward }
@@ -44,7 +51,15 @@ class Agent:
     
     # Updating value function.
     #----------------------------------------
-    def Evaluate_policy(self, probability_func )-> None:
+    def Evaluate_policy(self, probability_func, model:CompiledGridWorld=None )-> None:
+        
+        if self.evaluation != "sweep" :
+            self.Solve_policy(model)
+            return
+        
+        if model is not None and model.next_state is not None :       # deterministic fast path
+            self.__sweep_next_state(model)
+            return
         
         for it in range(self.__MAX_ITR) :
             
@@ -61,6 +76,95 @@ class Agent:
     
     
     
+    # In-place evaluation sweeps of a deterministic model:  V(s) = R(s') + gamma V(s') ,  s' = next_state[s,pi(s)]
+    # same updates & order as the probability_func sweep, by one table lookup instead of a sum over all states.
+    #----------------------------------------------------------------------------------------------------------------
+    def __sweep_next_state(self, model:CompiledGridWorld )-> None:
+        
+        states = model.state_ids(self.model_states).tolist()
+        next_ids = model.policy_next( self.get_policy(model) )[states].tolist()
+        R, V = model.R.tolist(), self.get_values(model).tolist()
+        
+        for _ in range(self.__MAX_ITR) :
+            
+            max_change = 0
+            for s, n in zip(states, next_ids) :
+                
+                value = R[n] + self.__GAMMA * V[n] if n >= 0 else 0.0
+                max_change = max( max_change, abs( value - V[s] ) )
+                V[s] = value
+            
+            if max_change < self.__MIN_ERROR :
+                break
+        
+        for st, s in zip(self.model_states, states) :
+            self.value_state_function[st] = V[s]
+    
+    
+    # Exact V(s) of the policy: solving (I - gamma P_pi) V = r_pi on the compiled model.
+    #-----------------------------------------------------------------------------------
+    def Solve_policy(self, model:CompiledGridWorld )-> None:
+        
+        if model is None :
+            raise ValueError(f"'{self.evaluation}' evaluation needs the compiled model: env.compile()")
+        
+        P_pi, r_pi = model.policy_model( self.get_policy(model) )
+        V = self.__linear_solve( P_pi, r_pi, self.get_values(model), self.evaluation )
+        
+        self.set_values(V, model)
+    
+    
+    # Sparse solve of (I - gamma P_pi) V = r_pi by "direct" | "bicgstab".
+    #-----------------------------------------------------------------------------------
+    def __linear_solve(self, P_pi, r_pi:np.ndarray, x0:np.ndarray, method:str )-> np.ndarray:
+        
+        A = sparse.identity(P_pi.shape[0], format="csr") - self.__GAMMA * P_pi
+        
+        if method == "direct" :
+            return linalg.spsolve( A.tocsc(), r_pi )
+        
+        elif method == "bicgstab" :
+            V, info = linalg.bicgstab( A, r_pi, x0=x0 )
+            if info != 0 :                                  # not converged -> direct solve
+                V = linalg.spsolve( A.tocsc(), r_pi )
+            return V
+        
+        else :
+            raise ValueError(f"unknown evaluation mode: {method}")
+    
+    
+    
+    
+    # Pickles of older Agents lack the evaluation mode -> the default one.
+    #-----------------------------------------------------------------------
+    def __setstate__(self, state:dict)->None:
+        
+        self.__dict__.update(state)
+        self.__dict__.setdefault("evaluation", "sweep")
+    
+    
+    # ======== Integer-id arrays:  s = i*cols + j  ,  a = index in ACTIONS =========
+    
+    # V(s) over state ids.
+    #----------------------------------------
+    def get_values(self, model:CompiledGridWorld )-> np.ndarray:
+        return model.value_array(self.value_state_function)
+    
+    def set_values(self, V:np.ndarray, model:CompiledGridWorld )-> None:
+        self.value_state_function.update( model.value_dict(V) )
+    
+    
+    # pi(s) over state ids -> action id, -1 for no action.
+    #----------------------------------------
+    def get_policy(self, model:CompiledGridWorld )-> np.ndarray:
+        return model.policy_array(self.policy)
+    
+    def set_policy(self, policy:np.ndarray, model:CompiledGridWorld )-> None:
+        self.policy.update( model.policy_dict(policy) )
+    
+    
+    
+    
     # =========== Control Problem ============
     
     # Q(s,a) Bellman equation Action-value function.
@@ -68,29 +172,48 @@ class Agent:
     def action_Value(self, state, action, probability_func)-> float:
         
         value = 0.0
-        for _ in range(self.__MAX_ITR):
-            for next_st in self.model_states:
-                value += probability_func(next_st, state, action) * (self.model_rewards.get(next_st, 0.0) + self.__GAMMA * self.value_state_function.get(next_st, 0.0) )
+        for next_st in self.model_states:
+            value += probability_func(next_st, state, action) * (self.model_rewards.get(next_st, 0.0) + self.__GAMMA * self.value_state_function.get(next_st, 0.0) )
         
         return value
     
     
+    # Q(s,a) table of all states & actions, one batched lookahead on the compiled model.
+    # Unavailable actions are -inf.
+    #-----------------------------------------------------------------------------------
+    def q_table(self, model:CompiledGridWorld )-> np.ndarray:
+        return model.backup( self.get_values(model), self.__GAMMA )
+    
+    
     # Improve policy
     #----------------------------------------
     def improve_policy(self,env) -> bool:
         
-        policy_sustainability = True
+        model = env.compile()
+        states = model.state_ids( list(env.actions) )
         
-        for st in env.actions :
-            
-            old_act = self.policy.get(st)
-            self.policy[st] = self.best_action(st,env.probability)
-            
-            
-            if old_act != self.policy.get(st,"") :
-                policy_sustainability = False
+        old_policy = self.get_policy(model)[states]
+        policy = self.greedy_policy( self.q_table(model), model, states, old_policy )
+        
+        for st, a in zip(env.actions, policy.tolist()) :
+            self.policy[st] = ACTIONS[a] if a >= 0 else ""
         
-        return policy_sustainability
+        return bool( np.array_equal(policy, old_policy) )
+    
+    
+    # Greedy action ids of the given state ids from a Q table -> -1 for no available action.
+    # keeping old action on ties -> no flip-flop between equal actions.
+    #------------------------------------------------------------------------------------------
+    def greedy_policy(self, Q:np.ndarray, model:CompiledGridWorld, states:np.ndarray, old_policy:np.ndarray )-> np.ndarray:
+        
+        Q = Q[states]
+        policy = np.where( model.mask[states].any(axis=1), Q.argmax(axis=1), -1 )
+        
+        has_old = old_policy >= 0
+        keep = np.zeros(len(states), dtype=bool)
+        keep[has_old] = Q[has_old, old_policy[has_old]] == Q[has_old].max(axis=1)
+        
+        return np.where(keep, old_policy, policy)
     
     
     # Finding Best action.
@@ -117,32 +240,105 @@ class Agent:
     
     # Updating iteratively until optimal.
     #---------------------------------------
-    def Update_policy(self, env ) -> None:
+    # Stops as soon as the policy is stable, or the improved policy no longer changes V(s).
+    # Returns a convergence report : { cycles, evaluations, value_change, residual, converged }
+    #   value_change -> max |V - V_old| of the last evaluation
+    #   residual     -> Bellman residual max |max_a Q(s,a) - V(s)| of the final V(s)
+    #---------------------------------------------------------------------------------------
+    def Update_policy(self, env ) -> dict:
         
-        is_stable = False
+        model = env.compile()
+        report = { "cycles":0, "evaluations":0, "value_change":float("inf"), "residual":0.0, "converged":False }
         
         for _ in range(self.__MAX_ITR*10):
-            for itr in range(self.__MAX_ITR):
-                
-                old_Vs = self.value_state_function
-                self.Evaluate_policy(env.probability)
-                is_stable = self.improve_policy(env)
-                
-            if is_stable or self.value_func_singularity(old_Vs):
-                return
+            
+            old_Vs = self.get_values(model)                              # V(s) snapshot
+            self.Evaluate_policy(env.probability, model)
+            report["evaluations"] += 1
+            
+            report["value_change"] = self.value_residual(old_Vs, model)
+            
+            # first cycle compares with the initial V(s), not a policy's value.
+            if report["cycles"] > 0 and report["value_change"] < self.__MIN_ERROR :
+                report["converged"] = True
+                break
+            
+            is_stable = self.improve_policy(env)
+            report["cycles"] += 1
+            
+            if is_stable :
+                report["converged"] = True
+                break
+        
+        V, _ = model.greedy( self.q_table(model) )
+        report["residual"] = float( np.abs( V - self.get_values(model) ).max() )
+        
+        return report
     
-    # Checking Value funtion doesn't change.
+    # Max change of value funtion since the old_Vs snapshot.
     #-------------------------------------------------------------
-    def value_func_singularity(self, old_Vs:dict) -> bool:
+    def value_residual(self, old_Vs:np.ndarray, model:CompiledGridWorld ) -> float:
+        return float( np.abs( self.get_values(model) - old_Vs ).max() )
+    
+    # Checking Value funtion doesn't change ( within threshold ).
+    #-------------------------------------------------------------
+    def value_func_singularity(self, old_Vs:np.ndarray, model:CompiledGridWorld ) -> bool:
+        return self.value_residual(old_Vs, model) < self.__MIN_ERROR
+    
+    
+    # Modified policy iteration on the compiled model:
+    # greedy improvement, then only k partial evaluation sweeps  V <- r_pi + gamma P_pi V
+    #   k=1 -> value iteration  ,  k=math.inf -> exact evaluation ( policy iteration )
+    # Stops when the Bellman residual is under threshold.
+    # Returns { cycles, sweeps, solves, residual, converged } -> the greedy backup of each cycle counts as a sweep.
+    #-------------------------------------------------------------------------------------------------------------
+    def Modified_policy_iteration(self, env, k=5, max_cycles:int=100000 ) -> dict:
+        
+        if not k >= 1 :
+            raise ValueError(f"k must be >= 1, got {k}")
         
-        is_same = True
+        model = env.compile()
+        V = self.get_values(model)
+        report = { "cycles":0, "sweeps":0, "solves":0, "residual":float("inf"), "converged":False }
         
-        for st in self.value_state_function :
-            if self.value_state_function.get(st,1e-5) != old_Vs.get(st,-1e-6):
-                is_same = False
+        while report["cycles"] < max_cycles :
+            
+            # improvement + first evaluation sweep share one backup: T_pi V = max_a Q(s,a)
+            greedy_V, policy = model.greedy( model.backup(V, self.__GAMMA) )
+            report["residual"] = float( np.abs(greedy_V - V).max() )
+            report["cycles"] += 1
+            report["sweeps"] += 1
+            
+            if report["residual"] < self.__MIN_ERROR :
+                report["converged"] = True
                 break
             
-        return is_same
+            V = greedy_V
+            if k == 1 :                                     # plain value iteration
+                continue
+            
+            if k == float("inf") :
+                P_pi, r_pi = model.policy_model(policy)
+                V = self.__linear_solve( P_pi, r_pi, V, "bicgstab" if self.evaluation == "bicgstab" else "direct" )
+                report["solves"] += 1
+            
+            elif model.next_state is not None :             # deterministic -> gather sweeps
+                next_ids = model.policy_next(policy)
+                acting = next_ids >= 0
+                for _ in range(int(k)-1):
+                    V = np.where( acting, model.R[next_ids] + self.__GAMMA * V[next_ids], 0.0 )
+                report["sweeps"] += int(k)-1
+            
+            else :
+                P_pi, r_pi = model.policy_model(policy)
+                for _ in range(int(k)-1):
+                    V = r_pi + self.__GAMMA * (P_pi @ V)
+                report["sweeps"] += int(k)-1
+        
+        self.set_values(V, model)
+        self.set_policy(policy, model)
+        
+        return report
     
     
     
@@ -161,15 +357,46 @@ class Agent:
 import pickle
 
 # saving Agent_class configs into file.
-#-----------------------------
-def save_agent(Agent_class:Agent, filename) -> None :
+# a ".gwm" filename writes the env's compiled model with V, policy & Q arrays
+# in the binary model format, else pickle.
+#-----------------------------------------------------------------------------
+def save_agent(Agent_class:Agent, filename, env=None) -> None :
+    
+    if str(filename).endswith(MODEL_EXT) :
+        
+        if env is None :
+            raise ValueError("binary agent files need the env: save_agent(agent, filename, env)")
+        
+        model = env.compile()
+        save_model( filename, model,
+                    V      = Agent_class.get_values(model),
+                    policy = Agent_class.get_policy(model),
+                    Q      = Agent_class.q_table(model) )
+        return
+    
     with open(filename, 'wb') as f:
         pickle.dump(Agent_class, f)
 
 
 # Loading Agent_class configs from file.
-#-------------------------------
+# [NOTE]: binary model files keep no agent settings -> a default Agent() gets V, policy & model data.
+#      For zero-copy access to V / policy / Q arrays, use load_model() directly.
+#----------------------------------------------------------------------------------------------------
 def load_agent(filename) -> Agent:
+    
+    if is_model_file(filename) :
+        
+        model, solution = load_model(filename)
+        
+        agent = Agent()
+        agent.value_state_function = model.value_dict(solution["V"])
+        agent.policy = model.policy_dict(solution["policy"])
+        
+        agent.model_states  = model.states_of( np.arange(model.n_states) )
+        agent.model_actions = list(model.actions)
+        agent.model_rewards = model.value_dict(model.R)
+        return agent
+    
     with open(filename, 'rb') as f:
         return pickle.load(f)
 
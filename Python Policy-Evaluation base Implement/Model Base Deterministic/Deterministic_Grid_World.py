@@ -1,5 +1,6 @@
 import pickle
 import numpy as np
+from Compiled_Grid_World import CompiledGridWorld, ACTIONS, ACTION_IDS, MODEL_EXT, save_model, load_model, is_model_file
 
 # Deterministic Grid-world class:
 #---------------------------------------------------------------
@@ -25,6 +26,9 @@ class GridWorld :
         # Rewards = { (i,j):float }
         self.rewards: dict = {}
         
+        # Compiled model cache -> dropped by set_config.
+        self.__model: CompiledGridWorld = None
+        
         self.__initialize_states()
         
     
@@ -38,45 +42,103 @@ class GridWorld :
     # Environment Transition function: T(s,a)-> r,s'
     #-----------------------------------------------
     def transition(self, action:str ) -> float :
+        return self.transition_id( ACTION_IDS.get(action,-1) )
+    
+    
+    # Id Transition function: T(s,a)-> r,s' by the next-state table ( a = action id ).
+    # unavailable action -> stays in place.
+    #---------------------------------------------------------------------------------
+    def transition_id(self, a:int ) -> float :
         
-        i,j = self.current_state
+        s, reward, _ = self.step_id( self.state_id(self.current_state), a )
+        self.current_state = self.state_of(s)
         
-        if action in self.actions.get(self.current_state):
-            if action == "U":
-                if i > 0 :
-                    i -= 1
-            elif action == "D":
-                if i < self.rows-1 :
-                    i += 1
-            elif action == "L":
-                if j > 0 :
-                    j -= 1
-            elif action == "R":
-                if j < self.cols-1:
-                    j += 1
+        return reward
+    
+    
+    # Stateless step: (state, "act") -> (next_state, reward, done). rng is unused ( deterministic ),
+    # kept for the same signature as the stochastic grid-world.
+    #-----------------------------------------------------------------------------------------------
+    def step(self, state:tuple, action:str, rng=None ) -> tuple :
         
-        self.current_state = (i,j)
-        return self.rewards.get(self.current_state,0)
+        s, reward, done = self.step_id( self.state_id(state), ACTION_IDS.get(action,-1) )
+        return self.state_of(s), reward, done
+    
+    
+    # Stateless id step: (s, a) -> (s', reward, done) by the next-state table. unavailable action -> stays.
+    #---------------------------------------------------------------------------------------------------------
+    def step_id(self, s:int, a:int, rng=None ) -> tuple :
+        
+        model = self.compile()
+        
+        if 0 <= a < model.n_actions and model.next_state[s,a] >= 0 :
+            s = int(model.next_state[s,a])
+        
+        return s, float(model.R[s]), bool(model.terminal[s])
+    
+    
+    # Grid move of an action, bounded by grid edges.
+    #-----------------------------------------------
+    def __move(self, state:tuple, action:str ) -> tuple :
+        
+        i,j = state
+        
+        if action == "U":
+            if i > 0 :
+                i -= 1
+        elif action == "D":
+            if i < self.rows-1 :
+                i += 1
+        elif action == "L":
+            if j > 0 :
+                j -= 1
+        elif action == "R":
+            if j < self.cols-1:
+                j += 1
+        
+        return (i,j)
     
     
     # Environment Transition Probability function: p(s',r|s,a)-> 0/1
     #-----------------------------------------------------------------
     def probability(self, to_state, from_state, action ):
         
-        i,j = 0,0
-        if   action == "U": i -= 1
-        elif action == "D": i += 1
-        elif action == "R": j += 1
-        elif action == "L": j -= 1
-        else : return 0.0
-        
-        if action in self.actions.get(from_state,[]):
-            if tuple((from_state[0]+i, from_state[1]+j)) == to_state :
-                return 1.0
-            else :
-                return 0.0
-        else : 
+        if not ( 0 <= to_state[0] < self.rows and 0 <= to_state[1] < self.cols ) :
+            return 0.0
+        
+        return self.probability_id( self.state_id(to_state), self.state_id(from_state), ACTION_IDS.get(action,-1) )
+    
+    
+    # Id Transition Probability function: p(s'|s,a) by state & action ids -> 0/1
+    #-----------------------------------------------------------------------------
+    def probability_id(self, to_s:int, from_s:int, a:int ) -> float :
+        
+        if not 0 <= a < len(ACTIONS) :
             return 0.0
+        
+        next_s = self.compile().next_state[from_s,a]
+        return 1.0 if next_s >= 0 and next_s == to_s else 0.0
+    
+    
+    # ======== Integer ids:  s = i*cols + j  ,  a = index in ACTIONS =========
+    
+    def state_id(self, state:tuple) -> int:
+        return state[0]*self.cols + state[1]
+    
+    def state_of(self, s:int) -> tuple:
+        return (int(s)//self.cols, int(s)%self.cols)
+    
+    def action_id(self, action:str) -> int:
+        return ACTION_IDS.get(action,-1)
+    
+    def action_of(self, a:int) -> str:
+        return ACTIONS[a]
+    
+    # Available action ids of state id s ( default: current state ).
+    def get_action_ids(self, s:int=None) -> np.ndarray:
+        if s is None :
+            s = self.state_id(self.current_state)
+        return np.flatnonzero( self.compile().mask[s] )
     
     
     # Some God Mode methods prototype
@@ -88,8 +150,16 @@ class GridWorld :
             return False
     
     def undo_action(self, action): pass
-    def get_next_state(self,state,action): pass
-    def set_state(self, new_state): pass
+    
+    # Next state of (state,"act") -> same state for an unavailable action.
+    def get_next_state(self,state,action):
+        return self.step(state, action)[0]
+    
+    # Moving the agent to new_state ( an in-grid state ).
+    def set_state(self, new_state):
+        if not ( 0 <= new_state[0] < self.rows and 0 <= new_state[1] < self.cols ) :
+            raise ValueError(f"state out of grid: {new_state}")
+        self.current_state = tuple(new_state)
     #=================================
     
     # Game-over check-method.
@@ -106,6 +176,49 @@ class GridWorld :
     def set_config( self, actions:dict, rewards: dict ):
         self.actions = actions
         self.rewards = rewards
+        self.__model = None
+    
+    
+    # Pickles of older GridWorlds lack the compiled-model cache -> default.
+    #-------------------------------------------------------------------------
+    def __setstate__(self, state:dict)->None:
+        
+        self.__dict__.update(state)
+        self.__dict__.setdefault("_GridWorld__model", None)
+    
+    
+    # Compiling grid-world into transition & reward arrays (cached until next set_config).
+    #-------------------------------------------------------------------------------------
+    def compile(self) -> CompiledGridWorld :
+        
+        if self.__model is None :
+            
+            outcomes = {}
+            for state, acts in self.actions.items():
+                for act in acts:
+                    outcomes[(state,act)] = { self.__move(state,act):1.0 }
+            
+            self.__model = CompiledGridWorld.from_dicts( self.rows, self.cols, self.rewards, outcomes )
+        
+        return self.__model
+    
+    
+    # Predecessor index of the compiled model ( cached, dropped by set_config ).
+    #---------------------------------------------------------------------------
+    def predecessors(self):
+        return self.compile().predecessors()
+    
+    
+    # (state,"act") pairs which can lead into the given state.
+    #-----------------------------------------------------------
+    def get_predecessors(self, state:tuple ) -> list :
+        
+        model = self.compile()
+        preds = model.predecessors()
+        s = model.state_id(state)
+        
+        return [ ( model.state_of(sa // model.n_actions), model.actions[sa % model.n_actions] )
+                 for sa in preds.indices[ preds.indptr[s]:preds.indptr[s+1] ] ]
     
     
     # Initialize Grid-world States.
@@ -124,15 +237,26 @@ class GridWorld :
 #============================
 
 # saving GW configs into file.
-#-----------------------------
+# a ".gwm" filename writes the compiled model in the binary model format, else pickle.
+#-------------------------------------------------------------------------------------
 def save_env(Gw, filename):
+    
+    if str(filename).endswith(MODEL_EXT) :
+        save_model(filename, Gw.compile())
+        return
+    
     with open(filename, 'wb') as f:
         pickle.dump(Gw, f)
 
 
 # Loading GW configs from file.
-#-------------------------------
+# binary model files give the memory-mapped CompiledGridWorld, pickle files the GridWorld.
+#-------------------------------------------------------------------------------------------
 def load_env(filename):
+    
+    if is_model_file(filename) :
+        return load_model(filename)[0]
+    
     with open(filename, 'rb') as f:
         return pickle.load(f)
 
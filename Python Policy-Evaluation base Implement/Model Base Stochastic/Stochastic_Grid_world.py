@@ -1,6 +1,11 @@
 
 import pickle
-from numpy import random
+import numpy as np
+from Compiled_Grid_World import CompiledGridWorld, UniformBuffer, ACTIONS, ACTION_IDS, MODEL_EXT, save_model, load_model, is_model_file
+
+
+# __draw() result of an available action without transition probabilities -> stays, reward 0.
+NO_PROBS = -2
 
 # Stochastic Grid-world class:
 #---------------------------------------------------------------
@@ -9,10 +14,11 @@ from numpy import random
 # Deterministic rewards -> you will get same-reward from any way you reach s' form s.
 class GridWorld :
     
-    def __init__(self, rows, cols, start_state):
+    def __init__(self, rows, cols, start_state, seed:int=None):
         
         self.cols:int = cols
         self.rows:int = rows
+        self.__invalid_action_reward: float = -10000
         
         # Agent Current State = (i,j)
         self.current_state: tuple = start_state
@@ -28,6 +34,16 @@ class GridWorld :
         
         self.probabilities: dict = {} 
         
+        # Compiled model cache -> dropped by set_config.
+        self.__model: CompiledGridWorld = None
+        
+        # Alias-table sampler of transition() -> rebuilt by set_config.
+        self.__sampler: tuple = None
+        
+        # Per-environment random generator, drawn through a buffer of uniforms.
+        self.rng = np.random.default_rng(seed)
+        self.__uniforms = UniformBuffer(self.rng)
+        
         # Probabilities:  key -> ( state, "action" )     |    value -> { "next-state":prob, "next-state2":prob }
         self.__initialize_states()
         
@@ -42,45 +58,139 @@ class GridWorld :
     # Environment Transition function: T(s,a)-> r,s'
     #-----------------------------------------------
     def transition(self, action:str ) -> float :
+        return self.transition_id( ACTION_IDS.get(action,-1) )
+    
+    
+    # Id Transition function: T(s,a)-> r,s' by the alias table of (s,a) ( a = action id ).
+    #---------------------------------------------------------------------------------------
+    def transition_id(self, a:int ) -> float :
         
-        next_state_probs:dict = self.probabilities.get( (self.current_state,action),{} )
-        
-        if next_state_probs == {} : 
+        s = self.__draw( self.state_id(self.current_state), a, self.__uniforms.next )
+        if s == NO_PROBS :
             return 0.0
+        if s < 0 :
+            return self.__invalid_action_reward
+        
+        self.current_state = self.state_of(s)
+        return self.__sampler[1][s]                                 # R(s')
+    
+    
+    # Stateless step: (state, "act") -> (next_state, reward, done) , sampled by the given rng.
+    # Never touches current_state or the env's generator -> one env can serve many concurrent rollouts.
+    #-----------------------------------------------------------------------------------------------------
+    def step(self, state:tuple, action:str, rng:np.random.Generator ) -> tuple :
+        
+        s, reward, done = self.step_id( self.state_id(state), ACTION_IDS.get(action,-1), rng )
+        return self.state_of(s), reward, done
+    
+    
+    # Stateless id step: (s, a) -> (s', reward, done). unavailable action -> stays, reward invalid-action reward
+    # ( 0 for an available action without probabilities ).
+    #----------------------------------------------------------------------------------------------
+    def step_id(self, s:int, a:int, rng:np.random.Generator ) -> tuple :
+        
+        next_s = self.__draw(s, a, rng.random)
+        _, R, _, _, _, _, terminal, _ = self.__sampler
+        
+        if next_s < 0 :
+            return s, 0.0 if next_s == NO_PROBS else self.__invalid_action_reward, terminal[s]
         
-        next_states = list(next_state_probs.keys())
-        next_probs  = list(next_state_probs.values())
+        return next_s, R[next_s], terminal[next_s]
+    
+    
+    # Alias draw of (s,a) by uniform() -> next state id, -1 for an unavailable action,
+    # NO_PROBS for an available action without transition probabilities.
+    #-------------------------------------------------------------------------------------
+    def __draw(self, s:int, a:int, uniform ) -> int :
+        
+        if self.__sampler is None :
+            self.__sampler = self.__build_sampler()
+        mask, _, indptr, indices, alias_prob, alias_next, _, listed = self.__sampler
+        
+        if not ( 0 <= a < len(ACTIONS) and mask[s][a] ) :
+            return NO_PROBS if 0 <= a < len(ACTIONS) and listed[s][a] else -1
+        
+        row = s*len(ACTIONS) + a
+        lo = indptr[row]
+        u = uniform() * (indptr[row+1] - lo)
+        k = lo + int(u)
+        
+        return indices[k] if u - int(u) < alias_prob[k] else alias_next[k]
+    
+    
+    # Compiled arrays & alias tables as plain lists -> cheap scalar access per step.
+    # [NOTE]: probabilities are validated & normalized here, once per set_config.
+    #--------------------------------------------------------------------------------
+    def __build_sampler(self) -> tuple :
         
-        index_list = [ i for i in range(len(next_states)) ]
-        index = random.choice(index_list, p=next_probs)
-        self.current_state = next_states[index]
+        model = self.compile()
+        alias_prob, alias_next = model.alias()
         
-        return self.rewards.get(self.current_state,0.0)
+        # actions of the actions dict ( the model's mask also drops the ones without probabilities ).
+        listed = np.zeros(model.mask.shape, dtype=bool)
+        for state, acts in self.actions.items():
+            for act in acts:
+                if act in ACTION_IDS :
+                    listed[ self.state_id(state), ACTION_IDS[act] ] = True
+        
+        return ( model.mask.tolist(), model.R.tolist(), model.P.indptr.tolist(), model.P.indices.tolist(),
+                 alias_prob.tolist(), alias_next.tolist(), model.terminal.tolist(), listed.tolist() )
+    
+    
+    # Reseeding the environment's random generator.
+    #-----------------------------------------------
+    def seed(self, seed:int=None )->None:
+        self.rng = np.random.default_rng(seed)
+        self.__uniforms = UniformBuffer(self.rng)
     
     
     # Environment Transition Probability function: p(s',r|s,a)-> [0,1]
     #-----------------------------------------------------------------
     def probability(self, to_state, from_state, action ):
         
-        i,j = 0,0
-        if   action == "U": i -= 1
-        elif action == "D": i += 1
-        elif action == "R": j += 1
-        elif action == "L": j -= 1
-        else : return 0.0
-        
+        # any next-state of the (s,a) distribution, not only the intended neighbour.
         if action in self.actions.get(from_state,[]):
-            if tuple((from_state[0]+i, from_state[1]+j)) == to_state :
-                
-                probs:dict = self.probabilities.get((from_state,action),{})
-                return probs.get(to_state, 0.0)
             
-            else :
-                return 0.0
+            probs:dict = self.probabilities.get((from_state,action),{})
+            return probs.get(to_state, 0.0)
+        
         else : 
             return 0.0
     
     
+    # Id Transition Probability function: p(s'|s,a) by state & action ids.
+    #----------------------------------------------------------------------
+    def probability_id(self, to_s:int, from_s:int, a:int ) -> float :
+        
+        model = self.compile()
+        if not model.mask[from_s,a] :
+            return 0.0
+        
+        next_ids, next_probs = model.outcomes(from_s,a)
+        return float( next_probs[ next_ids == to_s ].sum() )
+    
+    
+    # ======== Integer ids:  s = i*cols + j  ,  a = index in ACTIONS =========
+    
+    def state_id(self, state:tuple) -> int:
+        return state[0]*self.cols + state[1]
+    
+    def state_of(self, s:int) -> tuple:
+        return (int(s)//self.cols, int(s)%self.cols)
+    
+    def action_id(self, action:str) -> int:
+        return ACTION_IDS.get(action,-1)
+    
+    def action_of(self, a:int) -> str:
+        return ACTIONS[a]
+    
+    # Available action ids of state id s ( default: current state ).
+    def get_action_ids(self, s:int=None) -> np.ndarray:
+        if s is None :
+            s = self.state_id(self.current_state)
+        return np.flatnonzero( self.compile().mask[s] )
+    
+    
     # Some God Mode methods prototype
     #---------------------------------
     def is_terminal(self, state ):
@@ -90,8 +200,16 @@ class GridWorld :
             return False
     
     def undo_action(self, action)->None: raise NotImplementedError
-    def get_next_state(self,state,action): raise NotImplementedError
-    def set_state(self, new_state)->None: raise NotImplementedError
+    
+    # Sampled next state of (state,"act") -> rng defaults to the env's own generator.
+    def get_next_state(self, state, action, rng:np.random.Generator=None ):
+        return self.step(state, action, self.rng if rng is None else rng)[0]
+    
+    # Moving the agent to new_state ( an in-grid state ).
+    def set_state(self, new_state)->None:
+        if not ( 0 <= new_state[0] < self.rows and 0 <= new_state[1] < self.cols ) :
+            raise ValueError(f"state out of grid: {new_state}")
+        self.current_state = tuple(new_state)
     #=================================
     
     # Game-over check-method.
@@ -109,6 +227,55 @@ class GridWorld :
         self.actions = actions
         self.rewards = rewards
         self.probabilities = probs
+        self.__model = None
+        self.__sampler = self.__build_sampler()
+    
+    
+    # Pickles of older GridWorlds lack the compiled caches & the generator -> defaults.
+    #-------------------------------------------------------------------------------------
+    def __setstate__(self, state:dict)->None:
+        
+        self.__dict__.update(state)
+        self.__dict__.setdefault("_GridWorld__model", None)
+        self.__dict__.setdefault("_GridWorld__invalid_action_reward", -10000)
+        self.__dict__["_GridWorld__sampler"] = None                    # cache of any layout -> rebuilt on first transition
+        if "rng" not in self.__dict__ :
+            self.seed()
+    
+    
+    # Compiling grid-world into transition & reward arrays (cached until next set_config).
+    # [NOTE]: built from the full probabilities dict ( same model transition() samples from ).
+    #-------------------------------------------------------------------------------------
+    def compile(self) -> CompiledGridWorld :
+        
+        if self.__model is None :
+            
+            outcomes = {}
+            for state, acts in self.actions.items():
+                for act in acts:
+                    outcomes[(state,act)] = self.probabilities.get((state,act),{})
+            
+            self.__model = CompiledGridWorld.from_dicts( self.rows, self.cols, self.rewards, outcomes )
+        
+        return self.__model
+    
+    
+    # Predecessor index of the compiled model ( cached, dropped by set_config ).
+    #---------------------------------------------------------------------------
+    def predecessors(self):
+        return self.compile().predecessors()
+    
+    
+    # (state,"act") pairs which can lead into the given state.
+    #-----------------------------------------------------------
+    def get_predecessors(self, state:tuple ) -> list :
+        
+        model = self.compile()
+        preds = model.predecessors()
+        s = model.state_id(state)
+        
+        return [ ( model.state_of(sa // model.n_actions), model.actions[sa % model.n_actions] )
+                 for sa in preds.indices[ preds.indptr[s]:preds.indptr[s+1] ] ]
     
     
     # Initialize Grid-world States.
@@ -127,15 +294,26 @@ class GridWorld :
 #============================
 
 # saving GW configs into file.
-#-----------------------------
+# a ".gwm" filename writes the compiled model in the binary model format, else pickle.
+#-------------------------------------------------------------------------------------
 def save_env(Gw, filename)->None:
+    
+    if str(filename).endswith(MODEL_EXT) :
+        save_model(filename, Gw.compile())
+        return
+    
     with open(filename, 'wb') as f:
         pickle.dump(Gw, f)
 
 
 # Loading GW configs from file.
-#-------------------------------
+# binary model files give the memory-mapped CompiledGridWorld, pickle files the GridWorld.
+#-------------------------------------------------------------------------------------------
 def load_env(filename) -> GridWorld:
+    
+    if is_model_file(filename) :
+        return load_model(filename)[0]
+    
     with open(filename, 'rb') as f:
         return pickle.load(f)
 
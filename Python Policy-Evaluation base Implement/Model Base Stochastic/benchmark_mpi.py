@@ -0,0 +1,56 @@
+from Stochastic_Agent import Agent
+from Stochastic_Grid_world import GridWorld
+import time
+
+#-------------------------------------
+
+# Sticky NxN grid: every move succeeds by 0.8 and stays by 0.2,
+# goal on the top-right corner and a hole under it.
+def sticky_grid( n:int, cost:float ):
+
+    g = GridWorld(n,n,(n-1,0))
+    moves = { "U":(-1,0), "D":(1,0), "L":(0,-1), "R":(0,1) }
+
+    rewards = { (i,j):cost for i in range(n) for j in range(n) }
+    rewards[(0,n-1)] =  1.0
+    rewards[(1,n-1)] = -1.0
+
+    actions = {}
+    probs = {}
+    for i in range(n):
+        for j in range(n):
+
+            if (i,j) in [ (0,n-1), (1,n-1) ] :
+                continue
+
+            actions[(i,j)] = []
+            for act, (di,dj) in moves.items():
+                if 0 <= i+di < n and 0 <= j+dj < n :
+                    actions[(i,j)].append(act)
+                    probs[((i,j),act)] = { (i,j):0.2, (i+di,j+dj):0.8 }
+
+    g.set_config(actions,rewards,probs)
+    return g
+
+
+#-------------------------------------
+
+# Sweeps-to-convergence of modified policy iteration per k.
+size = 50
+env = sticky_grid(size, -0.04)
+env.compile()
+
+print("> Sticky Grid-World: %dx%d"%(size,size))
+print("|    k  | cycles | sweeps | solves |  time(s) |")
+
+for k in [ 1, 2, 5, 10, 20, 50, float("inf") ]:
+
+    agent = Agent(gamma=0.99)
+    agent.initialize_Vs(env.rows, env.cols)
+
+    start = time.perf_counter()
+    report = agent.Modified_policy_iteration(env, k)
+
+    print("| %5s | %6d | %6d | %6d | %8.4f |"%(k, report["cycles"], report["sweeps"], report["solves"], time.perf_counter()-start))
+
+#-------------------------------------
@@ -0,0 +1,218 @@
+# -------------------------------------------------------
+
+# Multi-process value iteration over a compiled Grid-World.
+# The state space is cut into blocks of grid rows, the blocks are swept by a process pool,
+# and the model & value/policy arrays live in multiprocessing.shared_memory
+# -> workers map the same buffers, no copy of the model per process.
+#
+#   "jacobi"       : every block reads V(k) and writes V(k+1) -> bit-identical to value_iteration().
+#   "gauss-seidel" : even blocks then odd blocks, in place on one V buffer -> odd blocks read the fresh values of even blocks.
+#                    Race-free only while no block's transitions reach another block of the same colour
+#                    ( true for row blocks of a 4-neighbour grid ); models with longer jumps
+#                    ( transitions= overrides, custom models ) fall back to "jacobi".
+
+# -------------------------------------------------------
+
+from Compiled_Grid_World import CompiledGridWorld
+from multiprocessing import Pool, shared_memory
+from scipy import sparse
+import numpy as np
+import time
+import os
+
+
+# Shared arrays of one solve: { name:(shape, dtype) } over shared_memory blocks.
+# ---------------------------------------------------------------------------------
+class SharedArrays :
+
+    def __init__(self, specs:dict, create:bool, names:dict=None):
+
+        self.specs:dict = specs
+        self.blocks:dict = {}
+        self.arrays:dict = {}
+
+        for key, (shape, dtype) in specs.items():
+
+            size = max( 1, int(np.prod(shape)) * np.dtype(dtype).itemsize )
+            if create :
+                shm = shared_memory.SharedMemory(create=True, size=size)
+            else :
+                shm = shared_memory.SharedMemory(name=names[key])
+
+            self.blocks[key] = shm
+            self.arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+    def names(self) -> dict :
+        return { key:shm.name for key, shm in self.blocks.items() }
+
+    def close(self, unlink:bool=False) -> None :
+
+        self.arrays = {}
+        for shm in self.blocks.values():
+            shm.close()
+            if unlink :
+                shm.unlink()
+
+
+# Worker side:
+# =========================
+
+_worker: dict = {}
+
+
+# Pool initializer -> attaching to the shared model & value buffers.
+# ---------------------------------------------------------------------
+def _attach( specs:dict, names:dict, n_states:int, n_actions:int, gamma:float ):
+
+    shared = SharedArrays(specs, create=False, names=names)
+    a = shared.arrays
+
+    _worker["shared"] = shared
+    _worker["n_states"] = n_states
+    _worker["n_actions"] = n_actions
+    _worker["gamma"] = gamma
+    _worker["rows"] = {}                                   # block -> CSR rows over views of the shared arrays
+
+
+# One block backup of states [lo,hi): reads V[src] / target, writes V[dst] & policy.
+# in-place ( src == dst ) also refreshes target of the block for the next blocks.
+# Returns max |dV| of the block.
+# ---------------------------------------------------------------------------------------
+def _sweep_block( lo:int, hi:int, src:int, dst:int ) -> float :
+
+    a = _worker["shared"].arrays
+    n_actions, gamma = _worker["n_actions"], _worker["gamma"]
+
+    # block rows of P: data & indices are views of the shared buffers, only the block indptr is local.
+    # ( set after construction : scipy copies a view much smaller than its buffer when building the matrix )
+    if (lo,hi) not in _worker["rows"] :
+        indptr = a["indptr"][ lo*n_actions : hi*n_actions+1 ]
+        start, end = int(indptr[0]), int(indptr[-1])
+        P_block = sparse.csr_matrix( ( a["data"][start:end], a["indices"][start:end], indptr - start ),
+                                     shape=( (hi-lo)*n_actions, _worker["n_states"] ) )
+        P_block.data, P_block.indices = a["data"][start:end], a["indices"][start:end]
+        _worker["rows"][(lo,hi)] = P_block
+    P_block = _worker["rows"][(lo,hi)]
+
+    # same operations as CompiledGridWorld.backup() / greedy() on the block rows.
+    Q = (P_block @ a["target"]).reshape(hi-lo, n_actions)
+    Q[~a["mask"][lo:hi]] = -np.inf
+
+    terminal = a["terminal"][lo:hi]
+    new_V = np.where(terminal, 0.0, Q.max(axis=1))
+
+    delta = float( np.abs(new_V - a["V"][src,lo:hi]).max() ) if hi > lo else 0.0
+
+    a["V"][dst,lo:hi] = new_V
+    a["policy"][lo:hi] = np.where(terminal, -1, Q.argmax(axis=1))
+
+    if src == dst :
+        a["target"][lo:hi] = a["R"][lo:hi] + gamma*new_V
+
+    return delta
+
+
+# Do the transitions of a block stay out of the other blocks of its colour? ( even / odd )
+# -------------------------------------------------------------------------------------------
+def colour_local( model:CompiledGridWorld, blocks:list ) -> bool :
+
+    block_of = np.repeat( np.arange(len(blocks)), [ hi-lo for lo, hi in blocks ] )
+
+    P = model.P
+    from_block = block_of[ np.repeat( np.arange(P.shape[0]) // model.n_actions, np.diff(P.indptr) ) ]
+    to_block = block_of[ P.indices ]
+
+    return not np.any( (from_block != to_block) & (from_block % 2 == to_block % 2) )
+
+
+# Parallel value iteration:
+# =========================
+def parallel_value_iteration( model:CompiledGridWorld, gamma:float, threshold:float, workers:int=None,
+                              mode:str="jacobi", block_rows:int=None, max_sweeps:int=100000 ):
+
+    if not isinstance(model, CompiledGridWorld) :       # a GridWorld ( deterministic or sticky )
+        model = model.compile()
+
+    if mode not in ("jacobi", "gauss-seidel") :
+        raise ValueError(f"unknown mode: {mode}")
+
+    workers = workers or os.cpu_count()
+    block_rows = block_rows or max( 1, -(-model.rows // workers) )
+    blocks = [ ( r*model.cols, min(r+block_rows, model.rows)*model.cols ) for r in range(0, model.rows, block_rows) ]
+
+    if mode == "gauss-seidel" and not colour_local(model, blocks) :
+        mode = "jacobi"                                 # in-place blocks of one colour would race
+
+    P = model.P
+    specs = {
+        "indptr"  : ( P.indptr.shape,  P.indptr.dtype  ),
+        "indices" : ( P.indices.shape, P.indices.dtype ),
+        "data"    : ( P.data.shape,    P.data.dtype    ),
+        "R"       : ( (model.n_states,),   np.float64 ),
+        "mask"    : ( model.mask.shape,    np.bool_   ),
+        "terminal": ( (model.n_states,),   np.bool_   ),
+        "V"       : ( (2,model.n_states),  np.float64 ),      # two buffers -> Jacobi swap
+        "target"  : ( (model.n_states,),   np.float64 ),      # R(s') + gamma V(s')
+        "policy"  : ( (model.n_states,),   np.int64   ),
+    }
+
+    shared = SharedArrays(specs, create=True)
+    start = time.perf_counter()
+
+    try :
+        a = shared.arrays
+        a["indptr"][:], a["indices"][:], a["data"][:] = P.indptr, P.indices, P.data
+        a["R"][:], a["mask"][:], a["terminal"][:] = model.R, model.mask, model.terminal
+        a["V"][:] = 0.0
+
+        init_args = ( specs, shared.names(), model.n_states, model.n_actions, gamma )
+        sweeps, src = 0, 0
+
+        with Pool(workers, initializer=_attach, initargs=init_args) as pool :
+
+            while True :
+
+                if mode == "jacobi" :
+                    a["target"][:] = model.R + gamma*a["V"][src]
+                    deltas = pool.starmap( _sweep_block, [ (lo,hi,src,1-src) for lo, hi in blocks ] )
+                    src = 1-src
+
+                else :
+                    a["target"][:] = model.R + gamma*a["V"][src]
+                    deltas  = pool.starmap( _sweep_block, [ (lo,hi,src,src) for lo, hi in blocks[0::2] ] )
+                    deltas += pool.starmap( _sweep_block, [ (lo,hi,src,src) for lo, hi in blocks[1::2] ] )
+
+                delta = max(deltas)
+                sweeps += 1
+
+                if delta < threshold or sweeps >= max_sweeps :
+                    break
+
+        V, policy = a["V"][src].copy(), a["policy"].copy()
+
+    finally :
+        shared.close(unlink=True)
+
+    return V, policy, { "sweeps":sweeps, "delta":delta, "mode":mode, "blocks":len(blocks), "workers":workers,
+                        "time":time.perf_counter()-start }
+
+
+
+
+# Test Space :
+#-----------------------
+if __name__ == "__main__" :
+
+    from Stochastic_Grid_world import standard_sticky_GW
+    from ValueIteration_detAgent import value_iteration
+
+    gamma, threshold = 0.9, 1e-3
+    model = standard_sticky_GW(-0.1).compile()
+
+    V, policy, info = value_iteration( model, gamma, threshold )
+    print("> single process :", info)
+
+    for mode in ["jacobi", "gauss-seidel"]:
+        pV, p_policy, p_info = parallel_value_iteration( model, gamma, threshold, workers=2, mode=mode )
+        print(f"> {mode:12} :", p_info, " identical:", np.array_equal(V, pV) and np.array_equal(policy, p_policy))
@@ -0,0 +1,391 @@
+
+import pickle
+import numpy as np
+from Compiled_Grid_World import CompiledGridWorld, UniformBuffer, ACTIONS, ACTION_IDS, MODEL_EXT, save_model, load_model, is_model_file
+
+
+# __draw() result of an available action without transition probabilities -> stays, reward 0.
+NO_PROBS = -2
+
+# Stochastic Grid-world class:
+#---------------------------------------------------------------
+
+# stochastic transition function -> if you choose U, maybe go down.
+# Deterministic rewards -> you will get same-reward from any way you reach s' form s.
+class GridWorld :
+    
+    def __init__(self, rows, cols, start_state, seed:int=None):
+        
+        self.cols:int = cols
+        self.rows:int = rows
+        self.__invalid_action_reward: float = -10000
+        
+        # Agent Current State = (i,j)
+        self.current_state: tuple = start_state
+        
+        # States = [ (i,j) ]
+        self.states : list = []
+        
+        # Actions = { (i,j):["U","D","R","L"] }
+        self.actions: dict = {}
+        
+        # Rewards = { (i,j):float }
+        self.rewards: dict = {}
+        
+        self.probabilities: dict = {} 
+        
+        # Compiled model cache -> dropped by set_config.
+        self.__model: CompiledGridWorld = None
+        
+        # Alias-table sampler of transition() -> rebuilt by set_config.
+        self.__sampler: tuple = None
+        
+        # Per-environment random generator, drawn through a buffer of uniforms.
+        self.rng = np.random.default_rng(seed)
+        self.__uniforms = UniformBuffer(self.rng)
+        
+        # Probabilities:  key -> ( state, "action" )     |    value -> { "next-state":prob, "next-state2":prob }
+        self.__initialize_states()
+        
+    
+    
+    # Current State Actions getter.
+    #----------------------------------
+    def get_actions(self):
+        return self.actions.get(self.current_state)
+    
+    
+    # Environment Transition function: T(s,a)-> r,s'
+    #-----------------------------------------------
+    def transition(self, action:str ) -> float :
+        return self.transition_id( ACTION_IDS.get(action,-1) )
+    
+    
+    # Id Transition function: T(s,a)-> r,s' by the alias table of (s,a) ( a = action id ).
+    #---------------------------------------------------------------------------------------
+    def transition_id(self, a:int ) -> float :
+        
+        s = self.__draw( self.state_id(self.current_state), a, self.__uniforms.next )
+        if s == NO_PROBS :
+            return 0.0
+        if s < 0 :
+            return self.__invalid_action_reward
+        
+        self.current_state = self.state_of(s)
+        return self.__sampler[1][s]                                 # R(s')
+    
+    
+    # Stateless step: (state, "act") -> (next_state, reward, done) , sampled by the given rng.
+    # Never touches current_state or the env's generator -> one env can serve many concurrent rollouts.
+    #-----------------------------------------------------------------------------------------------------
+    def step(self, state:tuple, action:str, rng:np.random.Generator ) -> tuple :
+        
+        s, reward, done = self.step_id( self.state_id(state), ACTION_IDS.get(action,-1), rng )
+        return self.state_of(s), reward, done
+    
+    
+    # Stateless id step: (s, a) -> (s', reward, done). unavailable action -> stays, reward invalid-action reward
+    # ( 0 for an available action without probabilities ).
+    #----------------------------------------------------------------------------------------------
+    def step_id(self, s:int, a:int, rng:np.random.Generator ) -> tuple :
+        
+        next_s = self.__draw(s, a, rng.random)
+        _, R, _, _, _, _, terminal, _ = self.__sampler
+        
+        if next_s < 0 :
+            return s, 0.0 if next_s == NO_PROBS else self.__invalid_action_reward, terminal[s]
+        
+        return next_s, R[next_s], terminal[next_s]
+    
+    
+    # Alias draw of (s,a) by uniform() -> next state id, -1 for an unavailable action,
+    # NO_PROBS for an available action without transition probabilities.
+    #-------------------------------------------------------------------------------------
+    def __draw(self, s:int, a:int, uniform ) -> int :
+        
+        if self.__sampler is None :
+            self.__sampler = self.__build_sampler()
+        mask, _, indptr, indices, alias_prob, alias_next, _, listed = self.__sampler
+        
+        if not ( 0 <= a < len(ACTIONS) and mask[s][a] ) :
+            return NO_PROBS if 0 <= a < len(ACTIONS) and listed[s][a] else -1
+        
+        row = s*len(ACTIONS) + a
+        lo = indptr[row]
+        u = uniform() * (indptr[row+1] - lo)
+        k = lo + int(u)
+        
+        return indices[k] if u - int(u) < alias_prob[k] else alias_next[k]
+    
+    
+    # Compiled arrays & alias tables as plain lists -> cheap scalar access per step.
+    # [NOTE]: probabilities are validated & normalized here, once per set_config.
+    #--------------------------------------------------------------------------------
+    def __build_sampler(self) -> tuple :
+        
+        model = self.compile()
+        alias_prob, alias_next = model.alias()
+        
+        # actions of the actions dict ( the model's mask also drops the ones without probabilities ).
+        listed = np.zeros(model.mask.shape, dtype=bool)
+        for state, acts in self.actions.items():
+            for act in acts:
+                if act in ACTION_IDS :
+                    listed[ self.state_id(state), ACTION_IDS[act] ] = True
+        
+        return ( model.mask.tolist(), model.R.tolist(), model.P.indptr.tolist(), model.P.indices.tolist(),
+                 alias_prob.tolist(), alias_next.tolist(), model.terminal.tolist(), listed.tolist() )
+    
+    
+    # Reseeding the environment's random generator.
+    #-----------------------------------------------
+    def seed(self, seed:int=None )->None:
+        self.rng = np.random.default_rng(seed)
+        self.__uniforms = UniformBuffer(self.rng)
+    
+    
+    # Environment Transition Probability function: p(s',r|s,a)-> [0,1]
+    #-----------------------------------------------------------------
+    def probability(self, to_state, from_state, action ):
+        
+        # any next-state of the (s,a) distribution, not only the intended neighbour.
+        if action in self.actions.get(from_state,[]):
+            
+            probs:dict = self.probabilities.get((from_state,action),{})
+            return probs.get(to_state, 0.0)
+        
+        else : 
+            return 0.0
+    
+    
+    # Id Transition Probability function: p(s'|s,a) by state & action ids.
+    #----------------------------------------------------------------------
+    def probability_id(self, to_s:int, from_s:int, a:int ) -> float :
+        
+        model = self.compile()
+        if not model.mask[from_s,a] :
+            return 0.0
+        
+        next_ids, next_probs = model.outcomes(from_s,a)
+        return float( next_probs[ next_ids == to_s ].sum() )
+    
+    
+    # ======== Integer ids:  s = i*cols + j  ,  a = index in ACTIONS =========
+    
+    def state_id(self, state:tuple) -> int:
+        return state[0]*self.cols + state[1]
+    
+    def state_of(self, s:int) -> tuple:
+        return (int(s)//self.cols, int(s)%self.cols)
+    
+    def action_id(self, action:str) -> int:
+        return ACTION_IDS.get(action,-1)
+    
+    def action_of(self, a:int) -> str:
+        return ACTIONS[a]
+    
+    # Available action ids of state id s ( default: current state ).
+    def get_action_ids(self, s:int=None) -> np.ndarray:
+        if s is None :
+            s = self.state_id(self.current_state)
+        return np.flatnonzero( self.compile().mask[s] )
+    
+    
+    # Some God Mode methods prototype
+    #---------------------------------
+    def is_terminal(self, state ):
+        if self.actions.get(state,[]) == [] :
+            return True
+        else:
+            return False
+    
+    def undo_action(self, action)->None: raise NotImplementedError
+    
+    # Sampled next state of (state,"act") -> rng defaults to the env's own generator.
+    def get_next_state(self, state, action, rng:np.random.Generator=None ):
+        return self.step(state, action, self.rng if rng is None else rng)[0]
+    
+    # Moving the agent to new_state ( an in-grid state ).
+    def set_state(self, new_state)->None:
+        if not ( 0 <= new_state[0] < self.rows and 0 <= new_state[1] < self.cols ) :
+            raise ValueError(f"state out of grid: {new_state}")
+        self.current_state = tuple(new_state)
+    #=================================
+    
+    # Game-over check-method.
+    #----------------------------
+    def game_over(self):
+        if self.actions.get(self.current_state,[]) == [] :
+            return True
+        else:
+            return False
+    
+    
+    # Updating grid-world's actions & rewards config.
+    #--------------------------------------------
+    def set_config( self, actions:dict, rewards: dict, probs: dict )->None:
+        self.actions = actions
+        self.rewards = rewards
+        self.probabilities = probs
+        self.__model = None
+        self.__sampler = self.__build_sampler()
+    
+    
+    # Pickles of older GridWorlds lack the compiled caches & the generator -> defaults.
+    #-------------------------------------------------------------------------------------
+    def __setstate__(self, state:dict)->None:
+        
+        self.__dict__.update(state)
+        self.__dict__.setdefault("_GridWorld__model", None)
+        self.__dict__.setdefault("_GridWorld__invalid_action_reward", -10000)
+        self.__dict__["_GridWorld__sampler"] = None                    # cache of any layout -> rebuilt on first transition
+        if "rng" not in self.__dict__ :
+            self.seed()
+    
+    
+    # Compiling grid-world into transition & reward arrays (cached until next set_config).
+    # [NOTE]: built from the full probabilities dict ( same model transition() samples from ).
+    #-------------------------------------------------------------------------------------
+    def compile(self) -> CompiledGridWorld :
+        
+        if self.__model is None :
+            
+            outcomes = {}
+            for state, acts in self.actions.items():
+                for act in acts:
+                    outcomes[(state,act)] = self.probabilities.get((state,act),{})
+            
+            self.__model = CompiledGridWorld.from_dicts( self.rows, self.cols, self.rewards, outcomes )
+        
+        return self.__model
+    
+    
+    # Predecessor index of the compiled model ( cached, dropped by set_config ).
+    #---------------------------------------------------------------------------
+    def predecessors(self):
+        return self.compile().predecessors()
+    
+    
+    # (state,"act") pairs which can lead into the given state.
+    #-----------------------------------------------------------
+    def get_predecessors(self, state:tuple ) -> list :
+        
+        model = self.compile()
+        preds = model.predecessors()
+        s = model.state_id(state)
+        
+        return [ ( model.state_of(sa // model.n_actions), model.actions[sa % model.n_actions] )
+                 for sa in preds.indices[ preds.indptr[s]:preds.indptr[s+1] ] ]
+    
+    
+    # Initialize Grid-world States.
+    #----------------------------------
+    def __initialize_states(self)->None:
+        
+        for r in range(self.rows):
+            for c in range(self.cols):
+                self.states.append((r,c))
+        
+    
+#======================================================================================================
+#======================================================================================================
+
+# Global functions:
+#============================
+
+# saving GW configs into file.
+# a ".gwm" filename writes the compiled model in the binary model format, else pickle.
+#-------------------------------------------------------------------------------------
+def save_env(Gw, filename)->None:
+    
+    if str(filename).endswith(MODEL_EXT) :
+        save_model(filename, Gw.compile())
+        return
+    
+    with open(filename, 'wb') as f:
+        pickle.dump(Gw, f)
+
+
+# Loading GW configs from file.
+# binary model files give the memory-mapped CompiledGridWorld, pickle files the GridWorld.
+#-------------------------------------------------------------------------------------------
+def load_env(filename) -> GridWorld:
+    
+    if is_model_file(filename) :
+        return load_model(filename)[0]
+    
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+# Standard GW creation.
+#-------------------------------
+def standard_sticky_GW(cost: float):
+    r = 3
+    c = 4
+    start_state = (2,0)
+    g = GridWorld(r,c,start_state)
+    
+    rewards = {}
+    for i in range(r):
+        for j in range(c):
+            rewards[(i,j)] = cost
+    rewards[(0,3)] = 1.0
+    rewards[(1,3)] = -1
+    rewards[(1,1)] = 0
+    
+    
+    actions = {
+        (0,0):["D","R"],
+        (0,1):["R","L"],
+        (0,2):["R","L","D"],
+        (1,0):["U","D"],
+        (1,2):["R","U","D"],
+        (2,0):["U","R"],
+        (2,1):["R","L"],
+        (2,2):["U","R","L"],
+        (2,3):["L","U"]
+    }
+    
+    probs = {
+        ( (0,0),"D" ): { (0,0):0.2 , (1,0):0.8 },
+        ( (0,0),"R" ): { (0,0):0.2 , (0,1,):0.8 },
+
+        ( (0,1),"L" ): { (0,1):0.2 , (0,0):0.8 },
+        ( (0,1),"R" ): { (0,1):0.2 , (0,2):0.8 },
+
+        ( (0,2),"R" ): { (0,2):0.2 , (0,3):0.8 },
+        ( (0,2),"L" ): { (0,2):0.2 , (0,1):0.8 },
+        ( (0,2),"D" ): { (0,2):0.2 , (1,2):0.8 },
+        
+        ( (1,0),"U" ): { (1,0):0.2 , (0,0):0.8 },
+        ( (1,0),"D" ): { (1,0):0.2 , (2,0):0.8 },
+        
+        # ( (1,1), ): { (,): , (,): },
+        
+        ( (1,2),"U" ): { (1,2):0.2 , (0,2):0.4, (1,3):0.4 },
+        ( (1,2),"D" ): { (1,2):0.2 , (2,2):0.8 },
+        ( (1,2),"R" ): { (1,2):0.2 , (1,3):0.8 },
+        
+        ( (2,0),"U" ): { (2,0):0.2 , (1,0):0.8 },
+        ( (2,0),"R" ): { (2,0):0.2 , (2,1):0.8 },
+        
+        ( (2,1),"R" ): { (2,1):0.2 , (2,2):0.8 },
+        ( (2,1),"L" ): { (2,1):0.2 , (2,0):0.8 },
+        
+        ( (2,2),"R" ): { (2,2):0.2 , (2,3):0.8 },
+        ( (2,2),"U" ): { (2,2):0.2 , (1,2):0.8 },
+        ( (2,2),"L" ): { (2,2):0.2 , (2,1):0.8 },
+        
+        ( (2,3),"L" ): { (2,3):0.2 , (2,2):0.8 },
+        ( (2,3),"U" ): { (2,3):0.2 , (1,3):0.8 },
+    }
+    
+    g.set_config(actions,rewards,probs)
+    
+    return g
+
+# ----------------------------------------------
+ 
+
+
@@ -16,11 +16,37 @@
 # -------------------------------------------------------
 
 from Deterministic_Grid_World import standard_GW, GridWorld, print_policy, print_value
+from Stochastic_Grid_world import standard_sticky_GW
+from Compiled_Grid_World import CompiledGridWorld
+import numpy as np
+import time
 
 
 # Helper Functions
 # ==================
 
+# One-step lookahead over the compiled transitions of (s,a):
+# ------------------------------------------------------------
+def action_value( cstste:tuple, act:str, valuefunc:dict, gamma:float, gw:GridWorld ):
+    
+    model = gw.compile()
+    s, a = model.state_id(cstste), model.action_id(act)
+    
+    if model.next_state is not None :                  # deterministic -> one next state
+        if a < 0 or model.next_state[s,a] < 0 :
+            return 0.0
+        n_state = model.state_of( model.next_state[s,a] )
+        return gw.rewards.get(n_state) + (gamma * valuefunc.get(n_state))
+    
+    row = s*model.n_actions + a
+    value = 0.0
+    for k in range( model.P.indptr[row], model.P.indptr[row+1] ):
+        n_state = model.state_of( model.P.indices[k] )
+        value += model.P.data[k] * ( gw.rewards.get(n_state) + (gamma * valuefunc.get(n_state)) )
+    
+    return value
+
+
 # Max value by avl actions of a state:
 # ------------------------------------
 def max_value_by_actions( cstste:tuple, valuefunc:dict, gamma:float, gw:GridWorld ):
@@ -29,9 +55,7 @@ def max_value_by_actions( cstste:tuple, valuefunc:dict, gamma:float, gw:GridWorl
     
     for act in gw.get_actions(cstste) :
         
-        value = 0.0
-        for n_state in gw.states :
-            value += gw.probability(n_state,cstste,act) * ( gw.rewards.get(n_state) + (gamma * valuefunc.get(n_state)) )
+        value = action_value( cstste, act, valuefunc, gamma, gw )
         
         if value > max_value :
             max_value = value
@@ -48,9 +72,7 @@ def max_action_by_value( cstste:tuple, optimalvalue:dict, gamma:float, gw:GridWo
     
     for act in gw.get_actions(cstste):
         
-        value = 0.0
-        for n_state in gw.states :
-            value += gw.probability(n_state,cstste,act) * ( gw.rewards.get(n_state) + (gamma * optimalvalue.get(n_state)) )
+        value = action_value( cstste, act, optimalvalue, gamma, gw )
             
         if value > best_value :
             best_value  = value
@@ -59,6 +81,208 @@ def max_action_by_value( cstste:tuple, optimalvalue:dict, gamma:float, gw:GridWo
     return best_action
 
 
+# Synchronous value iteration over the compiled model:
+# every sweep is one batched backup  V(s) = max_a sum P(s'|s,a) [ R(s') + gamma V(s') ]
+# and the greedy policy comes from the same final backup.
+# ---------------------------------------------------------------------------------------
+def value_iteration( model:CompiledGridWorld, gamma:float, threshold:float, max_sweeps:int=100000 ):
+    
+    if not isinstance(model, CompiledGridWorld) :       # a GridWorld ( deterministic or sticky )
+        model = model.compile()
+    
+    start = time.perf_counter()
+    
+    V = np.zeros(model.n_states)
+    sweeps = 0
+    
+    while True :
+        
+        new_V, policy = model.greedy( model.backup(V, gamma) )
+        delta = float( np.abs(new_V - V).max() )
+        
+        V = new_V
+        sweeps += 1
+        
+        if delta < threshold or sweeps >= max_sweeps :
+            break
+    
+    backups = sweeps * int( (~model.terminal).sum() )
+    return V, policy, { "sweeps":sweeps, "backups":backups, "delta":delta, "time":time.perf_counter()-start }
+
+
+# Prioritized-sweeping value iteration, backed up by frontiers:
+# every state keeps a bound on its Bellman residual; each round backs up, in one batched backup,
+# the frontier of states whose bound is over threshold*(1-gamma) ( -> |V - V*| under threshold ),
+# and a change of V(s) only raises the bound of the predecessors p of s by  max_a gamma * p(s|p,a) * |dV(s)|.
+# With sparse rewards ( no step cost ) the frontier stays near the goals' wave and few states are backed up.
+# With a step cost every state moves at first: while the frontier covers over 1/16 of the grid,
+# rounds are synchronous backups of all states ( exact residuals ), so it costs about as much as
+# value iteration run to the same error.
+#
+# Warm start: give the previous V & policy, and the seed states whose backup may have changed;
+# all other states are taken as already converged. Without V, it starts from zeros with every state seeded.
+# ---------------------------------------------------------------------------------------------------------
+def prioritized_sweeping( model:CompiledGridWorld, gamma:float, threshold:float,
+                          V:np.ndarray=None, policy:np.ndarray=None, seeds=None, max_backups:int=10**9 ):
+    
+    if not isinstance(model, CompiledGridWorld) :       # a GridWorld ( deterministic or sticky )
+        model = model.compile()
+    
+    start = time.perf_counter()
+    n_actions = model.n_actions
+    preds = model.predecessors()
+    
+    # batched backup of the states -> (values, actions) , states without actions keep V=0.
+    def backup(states:np.ndarray):
+        
+        if model.next_state is not None :               # deterministic -> one gather
+            Q = target[ model.next_state[states] ]
+        else :
+            rows = ( states[:,None]*n_actions + np.arange(n_actions) ).ravel()
+            Q = ( model.P[rows] @ target ).reshape(len(states), n_actions)
+        
+        mask = model.mask[states]
+        Q = np.where(mask, Q, -np.inf)
+        has_action = mask.any(axis=1)
+        
+        return np.where(has_action, Q.max(axis=1), 0.0), np.where(has_action, Q.argmax(axis=1), -1)
+    
+    
+    priority = np.zeros(model.n_states)                 # Bellman-residual bounds
+    
+    if V is None :
+        V = np.zeros(model.n_states)
+        policy = np.full(model.n_states, -1)
+        priority[~model.terminal] = np.inf
+    else :
+        V = np.array(V, dtype=np.float64)
+        policy = np.array(policy) if policy is not None else np.full(model.n_states, -1)
+        priority[ list(set(seeds)) if seeds is not None else slice(None) ] = np.inf
+    
+    target = model.R + gamma*V                          # R(s') + gamma V(s')
+    n_backups = int( (~model.terminal).sum() )
+    backups = rounds = 0
+    bound = threshold*(1-gamma)                         # residuals under it -> |V - V*| under threshold
+    
+    sweeping = False
+    
+    while backups < max_backups :
+        
+        # Synchronous rounds: one batched backup of all states gives the exact residuals, and only the
+        # states over bound move. Kept while the frontier covers most of the grid ( step costs ).
+        if sweeping :
+            
+            all_values, all_acts = model.greedy( model.backup(V, gamma) )
+            backups += n_backups                            # the last, verifying round included
+            rounds += 1
+            
+            residual = np.abs(all_values - V)
+            moved = residual >= bound
+            if not moved.any() :
+                break
+            
+            V = np.where(moved, all_values, V)
+            policy = np.where(moved, all_acts, policy)
+            
+            # back to frontier rounds -> residual bounds: the residual of the states that kept their value,
+            # raised by the moves of their successors.
+            sweeping = moved.sum() > model.n_states // 16
+            if not sweeping :
+                dV = np.where(moved, residual, 0.0)
+                if model.next_state is not None :
+                    moves = np.where(model.mask, dV[model.next_state], 0.0)
+                else :
+                    moves = ( model.P @ dV ).reshape(model.n_states, n_actions)
+                priority = np.where(moved, 0.0, residual) + gamma * moves.max(axis=1)
+                target = model.R + gamma*V
+            continue
+        
+        frontier = np.flatnonzero(priority >= bound)
+        if not len(frontier) :
+            break
+        if len(frontier) > model.n_states // 16 :
+            sweeping = True
+            continue
+        
+        values, acts = backup(frontier)
+        change = np.abs(values - V[frontier])
+        
+        V[frontier], policy[frontier] = values, acts
+        target[frontier] = model.R[frontier] + gamma*values
+        priority[frontier] = 0.0
+        backups += len(frontier)
+        rounds += 1
+        
+        # predecessors (p,a) of the moved states: sum over s of gamma p(s|p,a) |dV(s)| , then max over a.
+        moved = change > 0
+        sub = preds[ frontier[moved] ]
+        if not sub.nnz :
+            continue
+        
+        weights = gamma * sub.data * np.repeat( change[moved], np.diff(sub.indptr) )
+        rows, inverse = np.unique( sub.indices, return_inverse=True )
+        sums = np.bincount(inverse, weights=weights)
+        
+        states = rows // n_actions                      # sorted, s itself too on sticky self-loops
+        first = np.flatnonzero( np.r_[True, states[1:] != states[:-1]] )
+        priority[ states[first] ] += np.maximum.reduceat(sums, first)
+    
+    return V, policy, { "backups":backups, "rounds":rounds, "time":time.perf_counter()-start }
+
+
+# Incremental re-solve after a set_config change:
+# changes = { "actions":{ state:[acts] }, "rewards":{ state:reward }, "probs":{ (state,act):{ next:prob } } }
+# Only entries that really differ from the current config count ( "probs" needs a sticky GW ). The GW is re-configured,
+# then prioritized sweeping is warm-started from (V, policy) and seeded by the affected states:
+#   - states whose actions / transition probabilities changed.
+#   - predecessors of states whose arrival reward changed.
+# ---------------------------------------------------------------------------------------------------------
+def resolve( gw:GridWorld, V:np.ndarray, policy:np.ndarray, changes:dict, gamma:float, threshold:float ):
+    
+    actions = dict(gw.actions)
+    rewards = dict(gw.rewards)
+    is_sticky = hasattr(gw, "probabilities")
+    probs = dict(gw.probabilities) if is_sticky else {}
+    
+    if changes.get("probs") and not is_sticky :
+        raise ValueError("transition probabilities can only change on a sticky GridWorld")
+    
+    changed_states, changed_rewards = set(), set()
+    
+    for state, acts in changes.get("actions",{}).items():
+        if list(acts) != list(actions.get(state,[])) :
+            actions[state] = list(acts)
+            changed_states.add(state)
+    
+    for key, next_probs in changes.get("probs",{}).items():
+        if next_probs != probs.get(key,{}) :
+            probs[key] = next_probs
+            changed_states.add(key[0])
+    
+    for state, reward in changes.get("rewards",{}).items():
+        if reward != rewards.get(state,0) :
+            rewards[state] = reward
+            changed_rewards.add(state)
+    
+    if is_sticky :
+        gw.set_config(actions, rewards, probs)
+    else :
+        gw.set_config(actions, rewards)
+    
+    model = gw.compile()
+    preds = model.predecessors()
+    
+    seeds = { model.state_id(st) for st in changed_states }
+    for st in changed_rewards :
+        s = model.state_id(st)
+        seeds.update( (preds.indices[ preds.indptr[s]:preds.indptr[s+1] ] // model.n_actions).tolist() )
+    
+    V, policy, info = prioritized_sweeping( model, gamma, threshold, V=V, policy=policy, seeds=seeds )
+    info["seeds"] = len(seeds)
+    
+    return V, policy, info
+
+
 
 
 # Main Function logic
@@ -85,40 +309,47 @@ if __name__ == "__main__" :
 
     # GW Value-Evaluation 
     # [Why?!]-> try to find the best future-return by different actions of states: mag G(s,a)
-    while True :
-        
-        delta = 0.0  # max change per iteratin.
-        
-        for state in gw.states :
-            
-            if gw.is_terminal(state) : # only checking non-terminal states
-                continue
-            
-            old_value = value_func.get(state,0.0)
-            value_func[state] = max_value_by_actions( state, value_func, gamma, gw )
-            
-            delta = max( delta, abs(value_func[state]-old_value))
-        
-        if delta < threshold :
-            break
-        
+    model = gw.compile()
+    V, policy, info = value_iteration( model, gamma, threshold )
+    value_func = model.value_dict(V)
     
     print("> Optimal Val-function found")
+    print("> sweeps:",info["sweeps"]," time: %.4fs"%info["time"])
     print_value(value_func,gw)
     
-    
-    optimal_policy = {}
-    for state in gw.states:
-        
-        if gw.is_terminal(state) :
-            continue
-        
-        optimal_policy[state] = max_action_by_value( state, value_func, gamma, gw )
+    optimal_policy = model.policy_dict(policy)
     
     print()
     print("> Optimal Grid's Poliy found")
     print_policy(optimal_policy,gw)
     
     
-
-
+    # Same engine on the sticky Grid-World.
+    sgw = standard_sticky_GW(cost)
+    V, policy, info = value_iteration( sgw, gamma, threshold )
+    
+    print()
+    print("> Standard Sticky Grid-World")
+    print("> sweeps:",info["sweeps"]," time: %.4fs"%info["time"])
+    print_value( sgw.compile().value_dict(V), gw )
+    print_policy( sgw.compile().policy_dict(policy), gw )
+    
+    
+    # Prioritized sweeping: backups only where the residual bound is over threshold.
+    V, policy, info = prioritized_sweeping( model, gamma, threshold )
+    
+    print()
+    print("> Prioritized sweeping on Standard Grid-World")
+    print("> backups:",info["backups"]," time: %.4fs"%info["time"])
+    print_value( model.value_dict(V), gw )
+    print_policy( model.policy_dict(policy), gw )
+    
+    
+    # Incremental re-solve after a one-cell reward change.
+    V, policy, info = resolve( gw, V, policy, { "rewards":{ (0,3):2.0 } }, gamma, threshold )
+    
+    print()
+    print("> Re-solved after reward of (0,3) -> 2.0")
+    print("> seeds:",info["seeds"]," backups:",info["backups"]," time: %.4fs"%info["time"])
+    print_value( gw.compile().value_dict(V), gw )
+    print_policy( gw.compile().policy_dict(policy), gw )